@@ -0,0 +1,274 @@
+"""
+Benchmarks of ParaMPL.write(), of the avoid/border engine, and of drawing the written artists, run headless with
+the Agg backend.
+
+Each case is timed several times and its minimum and median are reported. Results can be saved as JSON, together
+with the versions and platform they were measured on, and compared against a previous run to catch regressions
+between releases:
+
+    python benchmarks/run.py --quick
+    python benchmarks/run.py --save benchmarks/results/0.3.7.json
+    python benchmarks/run.py --compare benchmarks/results/0.3.7.json --threshold 1.2
+    python benchmarks/run.py -k avoid
+
+Comparisons use the minimum time of each case, the least sensitive to other load on the machine, and only make
+sense between runs on the same machine.
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import parampl  # noqa: E402
+from parampl import ParaMPL  # noqa: E402
+from parampl.metrics import MetricCache  # noqa: E402
+from parampl.statics import merge_allows, parse_avoid  # noqa: E402
+
+SIZES = [10, 100, 1000, 10000, 100000]
+QUICK_SIZES = [10, 100, 1000]
+N_AVOIDS = [10, 100, 1000, 10000]
+QUICK_N_AVOIDS = [10, 100, 1000]
+
+
+def make_text(n_words: int, seed: int = 0, words_per_paragraph: int = 120) -> str:
+    """Return deterministic text of n_words from a vocabulary of a few thousand syllable-built words"""
+    rng = random.Random(seed)
+    syllables = ['lo', 'rem', 'ip', 'sum', 'do', 'lor', 'sit', 'a', 'met', 'con', 'sec', 'te', 'tur', 'ad',
+                 'pis', 'cing', 'e', 'lit', 'sed', 'ei', 'us', 'mod', 'tem', 'por', 'in', 'ci', 'di', 'dunt']
+    vocabulary = [''.join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) for _ in range(3000)]
+
+    words = [rng.choice(vocabulary) for _ in range(n_words)]
+    paragraphs = [' '.join(words[idx:idx + words_per_paragraph])
+                  for idx in range(0, n_words, words_per_paragraph)]
+    return '\n\n'.join(paragraphs)
+
+
+def make_axes():
+    figure = Figure(figsize=(6.4, 4.8), dpi=100)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    return figure, ax
+
+
+def clear_texts(ax):
+    for text in list(ax.texts):
+        text.remove()
+
+
+def make_avoids(n: int, seed: int = 0):
+    """Return n avoid regions, alternating sides, spread over the height of the axes"""
+    rng = random.Random(seed)
+    avoid_left_of, avoid_right_of = [], []
+    for idx in range(n):
+        bottom = rng.uniform(-1, 1)
+        region = (bottom, bottom + rng.uniform(0.001, 0.05))
+        if idx % 2:
+            avoid_left_of.append((rng.uniform(0, 0.3), region))
+        else:
+            avoid_right_of.append((rng.uniform(0.7, 1), region))
+    return avoid_left_of, avoid_right_of
+
+
+# Each case returns (run, reset): run() is timed, reset() is called untimed after each run.
+
+def case_write(n_words, cold=False, measure='renderer', words_per_paragraph=120, **kwargs):
+    figure, ax = make_axes()
+    text = make_text(n_words, words_per_paragraph=words_per_paragraph)
+    para = ParaMPL(ax, fontsize=7, measure=measure)
+    para.write(text, (0, 1), **kwargs)  # the words are then cached for warm runs
+    clear_texts(ax)
+
+    def run():
+        target = ParaMPL(ax, fontsize=7, measure=measure, metric_cache=MetricCache()) if cold else para
+        target.write(text, (0, 1), **kwargs)
+
+    return run, lambda: clear_texts(ax)
+
+
+def case_merge_allows(n_avoids):
+    avoid_left_of, avoid_right_of = make_avoids(n_avoids)
+
+    def run():
+        merge_allows(0, 1, parse_avoid(0, 1, avoid_left_of, avoid_right_of, 0.02))
+
+    return run, None
+
+
+def case_write_avoids(n_avoids, n_words=1000):
+    avoid_left_of, avoid_right_of = make_avoids(n_avoids)
+    return case_write(n_words, avoid_left_of=avoid_left_of, avoid_right_of=avoid_right_of)
+
+
+def case_write_rectangles(n_rectangles, n_words=1000):
+    figure, ax = make_axes()
+    text = make_text(n_words)
+    rng = random.Random(0)
+    para = ParaMPL(ax, fontsize=7)
+    for _ in range(n_rectangles):
+        left, bottom = rng.uniform(0, 1), rng.uniform(-1, 1)
+        para.avoid_rectangle(left, bottom, 0.05, 0.01)
+    para.write(text, (0, 1))
+    clear_texts(ax)
+
+    def run():
+        para.write(text, (0, 1))
+
+    return run, lambda: clear_texts(ax)
+
+
+def case_draw(n_words, **kwargs):
+    figure, ax = make_axes()
+    para = ParaMPL(ax, fontsize=7)
+    para.write(make_text(n_words), (0, 1), **kwargs)
+
+    def run():
+        figure.savefig(io.BytesIO(), format='png')
+
+    return run, None
+
+
+def cases(quick: bool = False):
+    """Yield the name and the setup of each benchmark case"""
+    sizes = QUICK_SIZES if quick else SIZES
+    n_avoids = QUICK_N_AVOIDS if quick else N_AVOIDS
+
+    for justify in ['left', 'right', 'center', 'full']:
+        for n_words in sizes:
+            yield f'write/justify/{justify}/{n_words}', lambda j=justify, n=n_words: case_write(n, justify=j)
+    for linebreak in ['greedy', 'optimal']:
+        yield f'write/linebreak/{linebreak}/1000', lambda b=linebreak: case_write(1000, linebreak=b,
+                                                                                   justify='full')
+        # a single paragraph, where the cost of breaking must stay linear in its number of lines
+        yield (f'write/linebreak/{linebreak}/paragraph/10000',
+               lambda b=linebreak: case_write(10000, words_per_paragraph=10000, linebreak=b, justify='full'))
+    for ha in ['left', 'center', 'right']:
+        for va in ['top', 'center', 'bottom']:
+            yield f'write/align/{ha}-{va}/1000', lambda h=ha, v=va: case_write(1000, ha=h, va=v)
+    for rotation in [0, 30, 90]:
+        yield f'write/rotation/{rotation}/1000', lambda r=rotation: case_write(1000, rotation=r,
+                                                                               justify='full')
+    for measure in ['renderer', 'glyphs']:
+        for n_words in [n for n in sizes if 100 <= n <= 10000]:
+            yield (f'write/cold/{measure}/{n_words}',
+                   lambda m=measure, n=n_words: case_write(n, cold=True, measure=m))
+            yield (f'write/warm/{measure}/{n_words}',
+                   lambda m=measure, n=n_words: case_write(n, measure=m))
+
+    for n in n_avoids:
+        yield f'avoid/merge/{n}', lambda n=n: case_merge_allows(n)
+        yield f'avoid/write/{n}', lambda n=n: case_write_avoids(n)
+        yield f'avoid/rectangles/{n}', lambda n=n: case_write_rectangles(n)
+
+    for justify in ['left', 'full']:
+        for n_words in sizes[:-1]:
+            yield f'draw/{justify}/{n_words}', lambda j=justify, n=n_words: case_draw(n, justify=j)
+
+
+def time_case(setup, min_time: float = 0.5, max_repeat: int = 20, min_repeat: int = 3) -> dict[str, float]:
+    """Time a case at least min_repeat times, and until min_time is spent or max_repeat is reached"""
+    run, reset = setup()
+    times = []
+    while len(times) < max_repeat and (len(times) < min_repeat or sum(times) < min_time):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        if reset is not None:
+            reset()
+
+    return {'min': min(times),
+            'median': statistics.median(times),
+            'repeat': len(times),
+            }
+
+
+def environment() -> dict[str, str]:
+    return {'parampl': parampl.__version__,
+            'matplotlib': matplotlib.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Print the ratio of each case against the baseline, and return the names of the regressions"""
+    regressions = []
+    print(f"\ncompared to parampl {baseline['environment'].get('parampl')} "
+          f"({baseline['environment'].get('date')}):")
+    for name, result in results.items():
+        if name not in baseline['results']:
+            print(f"  {name:40s} new")
+            continue
+        ratio = result['min'] / baseline['results'][name]['min']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        print(f"  {name:40s} {ratio:6.2f}x{flag}")
+
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('-k', dest='select', action='append', default=[],
+                        help="only run the cases whose name contains this text, can be repeated")
+    parser.add_argument('--quick', action='store_true',
+                        help="skip the largest texts and numbers of avoid regions")
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help="minimum time spent repeating each case, in seconds")
+    parser.add_argument('--save', type=Path,
+                        help="JSON file where to store the results")
+    parser.add_argument('--compare', type=Path,
+                        help="JSON file of a previous run to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, setup in cases(quick=args.quick):
+        if args.select and not any(select in name for select in args.select):
+            continue
+        results[name] = time_case(setup, min_time=args.min_time)
+        print(f"{name:40s} {results[name]['min'] * 1e3:10.2f} ms  "
+              f"(median {results[name]['median'] * 1e3:.2f} ms, {results[name]['repeat']} runs)", flush=True)
+
+    report = {'environment': environment(),
+              'results': results,
+              }
+    if args.save is not None:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, indent=1))
+
+    if args.compare is not None:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold}x")
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
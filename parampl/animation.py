@@ -0,0 +1,158 @@
+import numpy as np
+from matplotlib.text import Text
+
+__all__ = ['AnimatedParagraph']
+
+
+class AnimatedParagraph:
+    """
+    Paragraph laid out once by ParaMPL, and shown through a fixed pool of animated artists, meant for
+    FuncAnimation with blit=True. Each frame finds the lines in view by bisection, and only sets the text, position
+    and visibility of the pool's artists, changing the text only of the lines that enter the view or are being
+    typed. The cost of a frame then does not depend on the length of the text:
+
+        animated = parampl.animate(text, (0.05, 0.95), width=0.9)
+        FuncAnimation(figure, lambda frame: animated.frame(n_chars=2 * frame), init_func=animated.init,
+                      frames=animated.n_chars // 2 + 1, blit=True)
+
+    Lines are assumed to go down the axes, as they do unless the text is rotated by 90 degrees.
+
+    Parameters
+    ----------
+    parampl
+      ParaMPL instance used to lay out the paragraph
+    text
+      text to animate
+    xy
+      position of the paragraph
+    pool_size
+      number of artists for plain lines, and as many for justified lines. Defaults to the number of lines that fit
+      in the view of the axes
+    **kwargs
+      any other argument accepted by ParaMPL.write(), except styled runs and fit
+
+    Attributes
+    ----------
+    layout
+      Layout of the whole text
+    artists
+      artists of the pool, returned by every frame
+    n_chars
+      number of characters of the text, spaces between the words of a line included
+    """
+
+    def __init__(self,
+                 parampl,
+                 text: str,
+                 xy: tuple[float, float],
+                 pool_size: int | None = None,
+                 **kwargs,
+                 ):
+        layout = parampl._lay_out(text, xy, **kwargs)
+        if layout._tokens.styles is not None:
+            raise NotImplementedError("styled runs cannot be animated, they have several artists per line")
+
+        self.layout = layout
+        self._axes = parampl.get_axes()
+
+        self._texts = [layout.text(idx) for idx in range(len(layout))]
+        self._char_ends = np.cumsum([len(text) for text in self._texts], dtype=int)
+        self.n_chars: int = int(self._char_ends[-1]) if len(layout) else 0
+
+        # each kind of line cycles through its own pool, so that consecutive lines never share an artist
+        self._justified = [positions is not None for positions in layout._positions]
+        self._rank = np.zeros(len(layout), dtype=int)
+        counts = {False: 0, True: 0}
+        for idx, justified in enumerate(self._justified):
+            self._rank[idx] = counts[justified]
+            counts[justified] += 1
+
+        steps = -np.diff(layout.y)
+        self._pitch = float(np.median(steps)) if len(steps) and np.median(steps) > 0 else 0.0
+        if pool_size is None:
+            bottom, top = self._axes.get_ylim()
+            pool_size = int(np.ceil((top - bottom) / self._pitch)) + 2 if self._pitch > 0 else len(layout)
+        pool_size = max(1, min(pool_size, len(layout)))
+
+        self._pools: dict[bool, list[Text]] = {}
+        for justified in [False, True]:
+            pool = []
+            for _ in range(min(pool_size, counts[justified])):
+                artist = parampl._new_text(0, 0, [], layout._props,
+                                           positions=np.zeros((0, 2)) if justified else None, length=0)
+                artist.set_animated(True)
+                artist.set_visible(False)
+                self._axes._add_text(artist)
+                pool.append(artist)
+            self._pools[justified] = pool
+        self.artists: list[Text] = self._pools[False] + self._pools[True]
+
+        self._shown: dict[int, tuple[int, int]] = {}
+
+    def init(self) -> list[Text]:
+        """Hide every artist, as init_func of FuncAnimation"""
+        for artist in self.artists:
+            artist.set_visible(False)
+        return self.artists
+
+    def _set_line(self, artist, idx: int, n_chars: int) -> None:
+        """Show the first n_chars characters of line idx in the artist, unless it already does"""
+        if self._shown.get(id(artist)) == (idx, n_chars):
+            return
+        self._shown[id(artist)] = (idx, n_chars)
+
+        if not self._justified[idx]:
+            artist.set_text(self._texts[idx][:n_chars])
+            return
+
+        words, start = [], 0
+        for word in self.layout.words(idx):
+            if start >= n_chars:
+                break
+            words.append(word[:n_chars - start])
+            start += len(word) + 1
+        artist.set_words(words, self.layout._positions[idx][:len(words)], self.layout._lengths[idx])
+
+    def frame(self,
+              n_chars: int | None = None,
+              dy: float = 0.0,
+              ) -> list[Text]:
+        """
+        Show the text typed up to n_chars characters (all of it if None), moved up by dy in data units
+
+        Returns
+        -------
+        list[Text]
+          the artists to blit
+        """
+        layout = self.layout
+        if n_chars is None:
+            n_chars = self.n_chars
+        n_lines = min(len(layout), int(np.searchsorted(self._char_ends, n_chars, side='left')) + 1)
+
+        # lines whose baseline is in view, within a line pitch, found on the descending y
+        bottom, top = self._axes.get_ylim()
+        margin = self._pitch if self._pitch > 0 else layout.total_height
+        first = int(np.searchsorted(-layout.y, dy - top - margin, side='left'))
+        last = min(n_lines, int(np.searchsorted(-layout.y, dy - bottom + margin, side='right')))
+
+        used = set()
+        for idx in range(last - 1, first - 1, -1):
+            pool = self._pools[self._justified[idx]]
+            artist = pool[self._rank[idx] % len(pool)]
+            if id(artist) in used:  # more lines in view than artists, the last ones are kept
+                continue
+            used.add(id(artist))
+
+            typed = n_chars - (self._char_ends[idx - 1] if idx else 0)
+            self._set_line(artist, idx, int(min(typed, len(self._texts[idx]))))
+            position = (layout.x[idx], layout.y[idx] + dy)
+            if position != artist.get_position():
+                artist.set_position(position)
+            artist.set_visible(True)
+
+        for artist in self.artists:
+            if id(artist) not in used:
+                artist.set_visible(False)
+
+        return self.artists
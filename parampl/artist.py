@@ -0,0 +1,198 @@
+import matplotlib.colors as mcolors
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.text import Text
+from matplotlib.transforms import Bbox
+
+
+class JustifiedText(Text):
+    """
+    Text artist that draws the words of a line at individual offsets. A fully-justified line then needs a single
+    artist and a single draw call, instead of one Text per word. Words are anchored at the start of their
+    baseline (rotation_mode='anchor'), and the artist moves as a whole with set_position(), set_x(), or set_y().
+
+    Parameters
+    ----------
+    x, y
+      position of the first word
+    words
+      words of the line
+    offsets
+      (n_words, 2) array with the position of each word relative to the first one, in the artist's transform
+    length
+      length of the line along its direction, used to compute the extent of the artist
+    **kwargs
+      Text properties
+    """
+
+    def __init__(self,
+                 x: float, y: float,
+                 words: list[str],
+                 offsets,
+                 length: float,
+                 **kwargs,
+                 ):
+        super().__init__(x, y, ' '.join(words), **(kwargs | {'rotation_mode': 'anchor'}))
+
+        self._words = list(words)
+        self._offsets = np.asarray(offsets, dtype=float).reshape(-1, 2)
+        self._length = length
+
+    def get_words(self) -> list[str]:
+        """Return the words of the line"""
+        return self._words
+
+    def set_words(self, words: list[str], offsets, length: float) -> None:
+        """Set the words of the line, with their offsets and the length of the line as in the constructor"""
+        self._words = list(words)
+        self._offsets = np.asarray(offsets, dtype=float).reshape(-1, 2)
+        self._length = length
+        self.set_text(' '.join(words))
+        self.stale = True
+
+    def _word_positions(self):
+        """Return the display coordinates of the start of each word"""
+        return self.get_transform().transform(np.array(self.get_unitless_position()) + self._offsets)
+
+    def get_window_extent(self, renderer=None, dpi=None):
+        # the text laid out normally is at most as long as the justified line, hence extend it up to its end
+        bbox = super().get_window_extent(renderer=renderer, dpi=dpi)
+        if len(self._words) < 2:
+            return bbox
+
+        angle = np.radians(self.get_rotation())
+        end = self.get_transform().transform(np.array(self.get_unitless_position()) +
+                                             self._length * np.array([np.cos(angle), np.sin(angle)]))
+        return Bbox.union([bbox, Bbox([end, end])])
+
+    def draw(self, renderer):
+        # docstring inherited
+        if renderer is not None:
+            self._renderer = renderer
+        if not self.get_visible() or not self._words:
+            return
+
+        positions = self._word_positions()
+        if not np.isfinite(positions).all():
+            return
+
+        renderer.open_group('text', self.get_gid())
+
+        gc = renderer.new_gc()
+        gc.set_foreground(mcolors.to_rgba(self.get_color()), isRGBA=True)
+        gc.set_alpha(self.get_alpha())
+        gc.set_url(self.get_url())
+        gc.set_antialiased(self._antialiased)
+        gc.set_snap(self.get_snap())
+        self._set_gc_clip(gc)
+
+        if self.get_path_effects():
+            from matplotlib.patheffects import PathEffectRenderer
+            textrenderer = PathEffectRenderer(self.get_path_effects(), renderer)
+        else:
+            textrenderer = renderer
+
+        angle = self.get_rotation()
+        canvas_height = renderer.get_canvas_width_height()[1]
+        fontproperties = self.get_fontproperties()
+        for word, (x, y) in zip(self._words, positions):
+            if renderer.flipy():
+                y = canvas_height - y
+            clean_word, ismath = self._preprocess_math(word)
+            if not clean_word:
+                continue
+
+            if self.get_usetex():
+                textrenderer.draw_tex(gc, x, y, clean_word, fontproperties, angle)
+            else:
+                textrenderer.draw_text(gc, x, y, clean_word, fontproperties, angle, ismath=ismath)
+
+        gc.restore()
+        renderer.close_group('text')
+        self.stale = False
+
+
+class ParagraphArtist(Artist):
+    """
+    Paragraph written by ParaMPL whose layout is deferred to draw time. The layout is cached against a
+    fingerprint of the points-to-data scale of the axes (which accounts for limits, aspect, figure size, and DPI),
+    of the rectangles to avoid, and of the font and rcParams that change the widths, and is only recomputed when
+    the fingerprint changes. The text then keeps its size in points after zooming or resizing, while panning
+    reuses the cached layout.
+
+    Parameters
+    ----------
+    parampl
+      ParaMPL instance used to lay out the paragraph
+    text
+      text to write
+    xy
+      position of the paragraph
+    **kwargs
+      any other argument accepted by ParaMPL.write()
+    """
+
+    def __init__(self,
+                 parampl,
+                 text: str,
+                 xy: tuple[float, float],
+                 **kwargs,
+                 ):
+        super().__init__()
+
+        self._parampl = parampl
+        self._text = text
+        self._xy = xy
+        self._kwargs = kwargs
+
+        self._fingerprint = None
+        self._texts: list[Text] = []
+        self.total_height: float = 0
+        self.leftover: str = ""
+
+    def _layout_fingerprint(self):
+        # rounded, since panning changes the scale by floating-point noise only
+        return (tuple(float(f'{scale:.10g}') for scale in self._parampl._points_to_data()),
+                tuple(self._parampl._rectangles),
+                self._parampl._font_key(self._kwargs))
+
+    def _update_layout(self):
+        fingerprint = self._layout_fingerprint()
+        if fingerprint == self._fingerprint:
+            return
+
+        layout = self._parampl._lay_out(self._text, self._xy, **self._kwargs)
+        texts = self._parampl._new_texts(layout)
+        for text in texts:
+            text.set_figure(self.get_figure(root=False))
+            text.axes = self.axes
+
+        self.total_height = layout.total_height
+        self.leftover = self._parampl.leftover
+        self._texts = texts
+        self._fingerprint = fingerprint
+
+    def get_texts(self) -> list[Text]:
+        """Return the Text artists of the current layout"""
+        self._update_layout()
+        return self._texts
+
+    def get_children(self):
+        return list(self._texts)
+
+    def get_window_extent(self, renderer=None):
+        texts = self.get_texts()
+        if not texts:
+            return Bbox.null()
+        return Bbox.union([text.get_window_extent(renderer=renderer) for text in texts])
+
+    def draw(self, renderer):
+        # docstring inherited
+        if not self.get_visible():
+            return
+
+        self._update_layout()
+        for text in self._texts:
+            text.draw(renderer)
+
+        self.stale = False
@@ -0,0 +1,117 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from parampl.core import ParaMPL
+from parampl.metrics import MetricCache, shared_metrics
+
+figure_job = dict  # see render_figure() for its keys
+
+__all__ = ['render_figure', 'render_figures', 'figure_job']
+
+
+def render_figure(job: figure_job) -> str | bytes:
+    """
+    Render a figure described declaratively, with the Agg backend and without pyplot.
+
+    Parameters
+    ----------
+    job
+      dictionary with the keys:
+
+      - 'axes': list of axes, each a dictionary with the keys
+          - 'rect': (left, bottom, width, height) in figure coordinates, or 'subplot': (nrows, ncols, index).
+            Defaults to a single subplot
+          - 'xlim', 'ylim': limits of the axes, optional
+          - 'axis': value passed to Axes.axis(), such as 'off', optional
+          - 'parampl': arguments of ParaMPL, optional
+          - 'rectangles': list of (left, bottom, width, height) to avoid, optional
+          - 'paragraphs': list of dictionaries with the arguments of ParaMPL.write(), including 'text' and 'xy'
+      - 'filename': where to save the figure. If missing or None, the PNG is returned as bytes
+      - 'figsize', 'dpi': as in Figure(), optional
+      - 'savefig': other arguments of Figure.savefig(), optional
+
+    Returns
+    -------
+    str | bytes
+      filename, or the PNG image if no filename was given
+    """
+    figure = Figure(figsize=job.get('figsize'), dpi=job.get('dpi'))
+    FigureCanvasAgg(figure)
+
+    for spec in job.get('axes', []):
+        if 'rect' in spec:
+            ax = figure.add_axes(spec['rect'])
+        else:
+            ax = figure.add_subplot(*spec.get('subplot', (1, 1, 1)))
+
+        if 'xlim' in spec:
+            ax.set_xlim(spec['xlim'])
+        if 'ylim' in spec:
+            ax.set_ylim(spec['ylim'])
+        if 'axis' in spec:
+            ax.axis(spec['axis'])
+
+        parampl = ParaMPL(ax, **spec.get('parampl', {}))
+        for rectangle in spec.get('rectangles', []):
+            parampl.avoid_rectangle(*rectangle)
+        for paragraph in spec.get('paragraphs', []):
+            paragraph = dict(paragraph)
+            parampl.write(paragraph.pop('text'), paragraph.pop('xy'), **paragraph)
+
+    filename = job.get('filename')
+    if filename is None:
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format='png', **job.get('savefig', {}))
+        return buffer.getvalue()
+
+    figure.savefig(filename, **job.get('savefig', {}))
+    return filename
+
+
+def _initialize_worker(metrics: MetricCache) -> None:
+    shared_metrics.merge(metrics)
+
+
+def render_figures(jobs: list[figure_job],
+                   processes: int | None = None,
+                   chunksize: int = 1,
+                   mp_context=None,
+                   ) -> list[str | bytes]:
+    """
+    Render many figures in a pool of processes, each job as described in render_figure(). Jobs are
+    independent, so throughput scales with the number of cores as long as there are several jobs per process.
+
+    Every worker starts with a copy of the font metrics measured so far in this process (parampl.metrics.
+    shared_metrics), and keeps the metrics it measures for its next jobs. To also share the words measured by
+    other workers while the batch runs, give the same 'cache_dir' to ParaMPL in the 'parampl' arguments of the
+    axes.
+
+    Parameters
+    ----------
+    jobs
+      figures to render
+    processes
+      number of worker processes, defaults to the number of CPUs
+    chunksize
+      number of jobs sent to a worker at once, larger values reduce the communication for small figures
+    mp_context
+      multiprocessing context, defaults to the platform's
+
+    Returns
+    -------
+    list[str | bytes]
+      result of render_figure() for each job, in order
+    """
+    if processes is None:
+        processes = os.cpu_count()
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             mp_context=mp_context,
+                             initializer=_initialize_worker,
+                             initargs=(shared_metrics,),
+                             ) as executor:
+        return list(executor.map(render_figure, jobs, chunksize=chunksize))
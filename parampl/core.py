@@ -1,19 +1,48 @@
+import copy
+import json
+import os
+import threading
+from contextlib import nullcontext
+
 import matplotlib.artist
 import numpy as np
+from matplotlib import cbook
 from matplotlib.axes import Axes
-
-from parampl.statics import (split_into_paragraphs, parse_avoid,
-                             avoid_specification, avoid_single_specification, get_aspect)
+from matplotlib.collections import PathCollection
+from matplotlib.font_manager import FontProperties
+from matplotlib.lines import Line2D
+from matplotlib.patches import Rectangle
+from matplotlib.text import Text
+from matplotlib.transforms import Bbox, BboxBase, TransformedBbox
+
+from parampl.animation import AnimatedParagraph
+from parampl.artist import JustifiedText, ParagraphArtist
+from parampl.metrics import (GlyphAdvances, MetricCache, PersistentWidths, font_file, measuring_renderer,
+                             rendering_key, shared_metrics)
+from parampl.stats import PhaseStats
+from parampl.statics import (split_into_paragraphs, split_runs_into_paragraphs, iter_paragraphs, parse_avoid,
+                             merge_allows, cumulative_widths, line_break, optimal_breaks, avoid_specification,
+                             avoid_single_specification, get_aspect)
 
 rectangle_specification = tuple[float, float, float, float]  # left, right, bottom, top
+frame_specification = tuple[tuple[float, float], float, float | None]  # xy, width, max_height
+run_specification = str | tuple[str, dict]  # text, with the text properties that differ from the paragraph's
 
-__all__ = ['ParaMPL', 'avoid_specification', 'avoid_single_specification']
+style_keys = ['fontname', 'fontsize', 'family', 'weight', 'style', 'color']
+
+__all__ = ['ParaMPL', 'Layout', 'WrittenParagraph', 'TextStream',
+           'avoid_specification', 'avoid_single_specification']
 
 
 class _line_position:
     def __repr__(self):
         return f"Line's position currently at {self.x}, {self.y}: borders: {self.borders}"
 
+    @property
+    def borders(self) -> list[tuple[float, float, float]]:
+        """(limit, x, width) of each horizontal slab, from top to bottom"""
+        return list(zip(self._limits.tolist(), self._x_lefts.tolist(), self._widths.tolist()))
+
     def __init__(self,
                  xy,
                  width, height,
@@ -40,8 +69,10 @@ class _line_position:
         self.delta_x = spacing * height * np.sin(rotation * np.pi / 180) * y_to_x_ratio
         self.delta_y = - spacing * height * np.cos(rotation * np.pi / 180)
 
-        self.borders = [(None, self.x_orig, width)]
-        self.limit: float | None = None
+        self._allows = []
+        self._limits, self._x_lefts, self._widths = merge_allows(self.x_orig, width, self._allows)
+        self._border = None
+        self._ahead: list[float] = []  # heights of the current line and of the lines below it
         self.x = self.x_orig
         self.width_line = self.width
 
@@ -51,11 +82,25 @@ class _line_position:
         if justify not in ['right', 'center', 'left', 'full']:
             raise ValueError(f'Unrecognized justify {justify}')
 
+    def _border_at(self, y) -> int:
+        """Return the index of the slab at height y, by bisection over the descending limits"""
+        return int(np.searchsorted(-self._limits, -y, side='left'))
+
+    def _blocked(self, border) -> bool:
+        # the bottom slab spans the whole frame, hence lines moving down never get stuck there
+        return self._widths[border] <= 0 and border < len(self._limits) - 1 and self.delta_y < 0
+
     def check_next_border(self, force=False):
-        if force:
-            self.limit, self.x, self.width_line = self.borders.pop(0)
-        while self.limit is not None and self.y < self.limit:
-            self.limit, self.x, self.width_line = self.borders.pop(0)
+        border = self._border_at(self.y)
+        while self._blocked(border):
+            self.x += self.delta_x
+            self.y += self.delta_y
+            border = self._border_at(self.y)
+
+        if force or border != self._border:
+            self._border = border
+            self.x = self._x_lefts[border]
+            self.width_line = self._widths[border]
 
     def add_rectangles(self, rectangles):
         x = self.x_orig
@@ -66,12 +111,9 @@ class _line_position:
         for left, right, bottom, top in rectangles:
             left_space = left - x
             right_space = x + w - right
-            if left_space <= 0 and right_space <= 0:
-                print(f"Rectangle with limits ({left:.2g}, {right:.2g}, {bottom:2g}, {top:.2g}) leaves no writable "
-                      f"space when starting at x: {x} and width: {w}. \n Since it is not yet supported to skip "
-                      f"a horizontally-spanning slab, this rectangle is ignored.")
-                continue
-            if left_space < right_space:
+            if left_space <= 0 and right_space <= 0:  # no room on either side, lines skip the slab
+                avoid_left.append((x + w, (bottom, top)))
+            elif left_space < right_space:
                 avoid_left.append((right, (bottom, top)))
             else:
                 avoid_right.append((left, (bottom, top)))
@@ -80,10 +122,33 @@ class _line_position:
 
     def add_avoids(self, avoid_left_of, avoid_right_of, initialize=False):
         if avoid_left_of is not None or avoid_right_of is not None:
-            self.borders = parse_avoid(self.borders, avoid_left_of, avoid_right_of, self.height)
+            self._allows += parse_avoid(self.x_orig, self.width, avoid_left_of, avoid_right_of, self.height)
+            self._limits, self._x_lefts, self._widths = merge_allows(self.x_orig, self.width, self._allows)
+            self._ahead = []
 
         self.check_next_border(force=initialize)
-        pass
+
+    def next_y(self) -> float:
+        """Return the height of the next line, skipping the slabs that are fully blocked"""
+        y = self.y + self.delta_y
+        while self._blocked(self._border_at(y)):
+            y += self.delta_y
+        return y
+
+    def width_ahead(self, lines: int) -> float:
+        """Return the width available `lines` lines below the current one, without moving.
+
+The heights of the lines ahead are kept while the line does not move, hence asking for the lines of a paragraph in
+turn takes O(1) amortized per line."""
+        ahead = self._ahead
+        if not ahead or ahead[0] != self.y:
+            ahead[:] = [self.y]
+        while len(ahead) <= lines:
+            y = ahead[-1] + self.delta_y
+            while self._blocked(self._border_at(y)):
+                y += self.delta_y
+            ahead.append(y)
+        return self._widths[self._border_at(ahead[lines])]
 
     def offset(self,
                offset: float = 0,
@@ -112,6 +177,546 @@ class _line_position:
         return self.y_orig - lowest
 
 
+class _rectangle_index:
+    """
+    Uniform grid over the rectangles to avoid, about as many cells as rectangles, to find those overlapping a
+    frame without scanning all of them.
+    """
+
+    def __init__(self, rectangles: list[rectangle_specification]):
+        self.rectangles = rectangles
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        if not rectangles:
+            return
+
+        limits = np.array(rectangles, dtype=float)
+        n_cells = max(1, int(np.sqrt(len(rectangles))))
+        self.origin = limits[:, [0, 2]].min(axis=0)
+        self.size = np.maximum((limits[:, [1, 3]].max(axis=0) - self.origin) / n_cells, np.finfo(float).tiny)
+        self.n_cells = n_cells
+
+        first = self._cell(limits[:, [0, 2]])
+        last = self._cell(limits[:, [1, 3]])
+        for idx, ((i0, j0), (i1, j1)) in enumerate(zip(first.tolist(), last.tolist())):
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.cells.setdefault((i, j), []).append(idx)
+
+    def _cell(self, xy) -> np.ndarray:
+        return np.clip(np.floor((np.asarray(xy) - self.origin) / self.size), 0, self.n_cells - 1).astype(int)
+
+    def query(self,
+              left: float, right: float,
+              bottom: float, top: float,
+              ) -> list[rectangle_specification]:
+        """Return the rectangles that overlap the given limits, in the order they were added"""
+        if not self.rectangles:
+            return []
+
+        (i0, j0), (i1, j1) = self._cell([[left, bottom], [right, top]]).tolist()
+        found = set()
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                found.update(self.cells.get((i, j), []))
+
+        return [self.rectangles[idx] for idx in sorted(found)
+                if self.rectangles[idx][0] <= right and self.rectangles[idx][1] >= left
+                and self.rectangles[idx][2] <= top and self.rectangles[idx][3] >= bottom]
+
+
+class _runs:
+    """Text runs produced while pouring text into a frame, each one to become one artist"""
+
+    def __init__(self, props):
+        self.props = props
+        self.xy: list[tuple[float, float]] = []
+        self.line: list[int] = []
+        self.paragraph: list[int] = []
+        self.start: list[int] = []
+        self.stop: list[int] = []
+        self.positions: list[np.ndarray | None] = []
+        self.lengths: list[float | None] = []
+
+    def add(self, x, y, line, paragraph, start, stop, positions=None, length=None):
+        self.xy.append((x, y))
+        self.line.append(line)
+        self.paragraph.append(paragraph)
+        self.start.append(start)
+        self.stop.append(stop)
+        self.positions.append(positions)
+        self.lengths.append(length)
+
+
+class Layout:
+    """
+    Result of a layout that creates no artists: where each run of text goes, as returned by ParaMPL.layout().
+    A run is a line of text, drawn as a single artist.
+
+    Attributes
+    ----------
+    x, y
+      position of each run in data coordinates, after the vertical alignment
+    line
+      index of the line of each run
+    paragraph
+      index of the paragraph of each run
+    start, stop
+      index of the first word, and after the last word, of each run within its paragraph
+    total_height
+      height of the laid out text
+    fontsize
+      font size in points, as chosen by fit='shrink' if requested
+    overflow
+      (paragraph, word) where the text stopped fitting in max_height, None if all of it fitted
+    """
+
+    def __init__(self, runs: _runs, tokens, total_height: float, y_offset: float,
+                 overflow: tuple[int, int] | None):
+        xy = np.array(runs.xy, dtype=float).reshape(-1, 2)
+        self.x: np.ndarray = xy[:, 0]
+        self.y: np.ndarray = xy[:, 1] + y_offset
+        self.line: np.ndarray = np.array(runs.line, dtype=int)
+        self.paragraph: np.ndarray = np.array(runs.paragraph, dtype=int)
+        self.start: np.ndarray = np.array(runs.start, dtype=int)
+        self.stop: np.ndarray = np.array(runs.stop, dtype=int)
+        self.total_height: float = total_height
+        self.fontsize: float = tokens.fontsize
+        self.overflow: tuple[int, int] | None = overflow
+
+        self._tokens = tokens
+        self._props = runs.props
+        self._positions = runs.positions
+        self._lengths = runs.lengths
+        self._y_offset = y_offset
+
+    def __len__(self):
+        return len(self.x)
+
+    def words(self, idx: int) -> list[str]:
+        """Return the words of a run"""
+        return self._tokens.paragraphs[self.paragraph[idx]][self.start[idx]:self.stop[idx]]
+
+    def text(self, idx: int) -> str:
+        """Return the text of a run"""
+        return ' '.join(self.words(idx))
+
+    @property
+    def leftover(self) -> str:
+        """Text that did not fit"""
+        if self.overflow is None:
+            return ""
+        return self._tokens.leftover(self.overflow)
+
+    def _after(self, head: "Layout", n_runs: int) -> "Layout":
+        """Return this layout, which resumed after the first n_runs runs of head, preceded by those runs"""
+        ret = copy.copy(self)
+        ret.x = np.concatenate([head.x[:n_runs], self.x])
+        ret.y = np.concatenate([head.y[:n_runs] + self._y_offset - head._y_offset, self.y])
+        for name in ['line', 'paragraph', 'start', 'stop']:
+            setattr(ret, name, np.concatenate([getattr(head, name)[:n_runs], getattr(self, name)]))
+        ret._positions = head._positions[:n_runs] + self._positions
+        ret._lengths = head._lengths[:n_runs] + self._lengths
+        return ret
+
+
+class WrittenParagraph(tuple):
+    """
+    Text written by ParaMPL.write(), which unpacks as the (artists, total_height) tuple that write() used to
+    return, with the current values after an update, and can be updated in place. update() measures only the
+    changed paragraphs, lays out the text again only from the line before the first changed word, and reuses the
+    existing Text artists with set_text() and set_position(), so that a refresh costs in proportion to the edit.
+    Artists are created or removed when the number of lines changes, and replaced when a line changes between
+    justified and plain (e.g. a paragraph's last line moving), or when fit='shrink' picks another fontsize.
+    save() stores the layout as a snapshot for ParaMPL.replay().
+
+    Attributes
+    ----------
+    artists
+      Text artists, one per line, updated in place
+    layout
+      current Layout
+    """
+
+    def __new__(cls, parampl: "ParaMPL", layout: Layout, artists: list[Text], xy, kwargs, text):
+        self = super().__new__(cls, (artists, layout.total_height))
+        self.artists: list[Text] = artists
+        self.layout: Layout = layout
+        self._parampl = parampl
+        self._xy = xy
+        self._kwargs = kwargs
+        self._text = text
+        return self
+
+    def __iter__(self):
+        return iter((self.artists, self.total_height))
+
+    def __getitem__(self, idx):
+        return (self.artists, self.total_height)[idx]
+
+    @property
+    def total_height(self) -> float:
+        """Height of the current text"""
+        return self.layout.total_height
+
+    @property
+    def leftover(self) -> str:
+        return self.layout.leftover
+
+    def _restart(self, paragraphs) -> int | None:
+        """Return the number of runs, from the start, that the new paragraphs cannot change, None if they are the
+        same paragraphs"""
+        old = self.layout
+        old_paragraphs = old._tokens.paragraphs
+        for idx_paragraph, (old_words, new_words) in enumerate(zip(old_paragraphs, paragraphs)):
+            if old_words != new_words:
+                idx_word = next((idx for idx, (old_word, new_word) in enumerate(zip(old_words, new_words))
+                                 if old_word != new_word), min(len(old_words), len(new_words)))
+                break
+        else:
+            if len(old_paragraphs) == len(paragraphs):
+                return None
+            idx_paragraph, idx_word = min(len(old_paragraphs), len(paragraphs)), 0
+
+        before = np.flatnonzero((old.paragraph < idx_paragraph) |
+                                ((old.paragraph == idx_paragraph) & (old.start <= idx_word)))
+        if not len(before):
+            return 0
+        run = before[-1]
+
+        # a line can only change if its first word changed (it may fit in the previous line), or a later one
+        if run > 0 and old.start[run] == idx_word and old.paragraph[run - 1] == old.paragraph[run]:
+            run -= 1
+        # optimal breaks depend on the whole paragraph, and a new fontsize on the whole text
+        if self._kwargs.get('linebreak') == 'optimal':
+            run = np.flatnonzero(old.paragraph == old.paragraph[run])[0]
+        if self._kwargs.get('fit') is not None:
+            run = 0
+        return int(run)
+
+    def update(self, text: "str | list[run_specification]") -> "WrittenParagraph":
+        """
+        Replace the text, reusing the artists of the lines that did not change
+
+        Parameters
+        ----------
+        text
+          new text. Styled runs, or text replacing styled runs, are written again in full
+
+        Returns
+        -------
+        WrittenParagraph
+          self
+        """
+        parampl, old, artists = self._parampl, self.layout, self.artists
+        if not isinstance(text, str) or old._tokens.styles is not None:
+            # artists of styled runs do not follow lines, hence they are not reused
+            layout = parampl._lay_out(text, self._xy, **self._kwargs)
+            for artist in artists:
+                artist.remove()
+            artists[:] = parampl._new_texts(layout)
+            for artist in artists:
+                parampl._axes._add_text(artist)
+            self.layout = layout
+            self._text = text
+            return self
+
+        with parampl._phase('split') as info:
+            paragraphs, _ = split_into_paragraphs(text,
+                                                  collapse_whites=self._kwargs.get('collapse_whites', True),
+                                                  paragraph_per_line=self._kwargs.get('paragraph_per_line', False),
+                                                  )
+            paragraphs = [paragraph.split(' ') for paragraph in paragraphs]
+            info['paragraphs'] = len(paragraphs)
+        n_runs = self._restart(paragraphs)
+        if n_runs is None:
+            return self
+
+        # fit='shrink' measures the text again at each size it tries, other tokens only miss the changed paragraphs
+        tokens = None
+        if self._kwargs.get('fit') is None:
+            props = {'fontname': None} | old._props
+            tokens = old._tokens.edited(paragraphs,
+                                        lambda changed: parampl._tokenize(changed, old._tokens.paragraph_sep,
+                                                                          props).widths)
+
+        resume = ((int(old.paragraph[n_runs]), int(old.start[n_runs])), int(old.line[n_runs])) if n_runs else None
+        layout = parampl._lay_out(text, self._xy, resume=resume, tokens=tokens, **self._kwargs)
+        if resume is not None:
+            layout = layout._after(old, n_runs)
+        if layout.fontsize != old.fontsize:  # fit='shrink' chose another size, no artist can be reused
+            n_runs = 0
+            for artist in artists:
+                artist.remove()
+            artists.clear()
+
+        # lines before the restart only move if the vertical alignment changed with the new height
+        for idx in range(n_runs):
+            if (layout.x[idx], layout.y[idx]) != (old.x[idx], old.y[idx]):
+                artists[idx].set_position((layout.x[idx], layout.y[idx]))
+
+        for idx in range(n_runs, len(layout)):
+            words, positions, length = layout.words(idx), layout._positions[idx], layout._lengths[idx]
+            xy = (layout.x[idx], layout.y[idx])
+            if idx < len(artists) and isinstance(artists[idx], JustifiedText) == (positions is not None):
+                artist = artists[idx]
+                if positions is None:
+                    artist.set_text(' '.join(words))
+                elif (words != artist.get_words() or length != artist._length
+                      or not np.array_equal(positions, artist._offsets)):
+                    artist.set_words(words, positions, length)
+                if xy != artist.get_position():
+                    artist.set_position(xy)
+                continue
+
+            artist = parampl._new_text(*xy, words, layout._props, positions=positions, length=length)
+            parampl._axes._add_text(artist)
+            if idx < len(artists):
+                artists[idx].remove()
+                artists[idx] = artist
+            else:
+                artists.append(artist)
+
+        for artist in artists[len(layout):]:
+            artist.remove()
+        del artists[len(layout):]
+
+        self.layout = layout
+        self._text = text
+        return self
+
+    def save(self, path: str | os.PathLike) -> None:
+        """
+        Save the current layout as a JSON snapshot: the text and arguments, the measured words, and each line with
+        its coordinates in points from xy. ParaMPL.replay() then writes it without measuring nor breaking lines
+
+        Parameters
+        ----------
+        path
+          file to write
+        """
+        snapshot = self._parampl._snapshot(self._text, self._xy, self._kwargs, self.layout)
+        with open(path, 'w') as fp:
+            json.dump(snapshot, fp, separators=(',', ':'))
+
+
+class _tokens:
+    """Paragraphs split into words, with their widths in points, ready to be poured into one or more frames"""
+
+    styles: list[dict] | None = None
+
+    def __init__(self, paragraphs, paragraph_sep, widths, space, height, fontsize):
+        self.paragraphs: list[list[str]] = paragraphs
+        self.paragraph_sep: str = paragraph_sep
+        self.widths: list[np.ndarray] = widths
+        self.space: float = space
+        self.height: float = height
+        self.fontsize: float = fontsize
+
+    def scaled(self, factor: float) -> "_tokens":
+        """Return the tokens as they would measure with a font `factor` times larger"""
+        return _tokens(self.paragraphs, self.paragraph_sep, [widths * factor for widths in self.widths],
+                       self.space * factor, self.height * factor, self.fontsize * factor)
+
+    def widest(self) -> float:
+        return max((widths.max() for widths in self.widths if len(widths)), default=0)
+
+    def snapshot(self) -> dict:
+        """Return the tokens as JSON-able data"""
+        return {'paragraphs': self.paragraphs,
+                'paragraph_sep': self.paragraph_sep,
+                'widths': [widths.tolist() for widths in self.widths],
+                'space': self.space,
+                'height': self.height,
+                'fontsize': self.fontsize,
+                }
+
+    @staticmethod
+    def from_snapshot(snapshot: dict) -> "_tokens":
+        """Return the tokens stored by snapshot()"""
+        widths = [np.array(widths, dtype=float) for widths in snapshot['widths']]
+        if 'styles' not in snapshot:
+            return _tokens(snapshot['paragraphs'], snapshot['paragraph_sep'], widths,
+                           snapshot['space'], snapshot['height'], snapshot['fontsize'])
+        return _styled_tokens(snapshot['paragraphs'], snapshot['paragraph_sep'], widths,
+                              [np.array(spaces, dtype=float) for spaces in snapshot['spaces']],
+                              [[[tuple(piece) for piece in word] for word in paragraph]
+                               for paragraph in snapshot['pieces']],
+                              snapshot['styles'], snapshot['space'], snapshot['height'], snapshot['fontsize'])
+
+    def edited(self, paragraphs: list[list[str]], measure) -> "_tokens":
+        """Return the tokens of edited paragraphs, keeping the widths of those unchanged at the start and at the
+        end, and measuring the others with measure(paragraphs), which returns their widths"""
+        n_same = min(len(self.paragraphs), len(paragraphs))
+        head = next((idx for idx in range(n_same) if self.paragraphs[idx] != paragraphs[idx]), n_same)
+        tail = next((idx for idx in range(n_same - head) if self.paragraphs[-1 - idx] != paragraphs[-1 - idx]),
+                    n_same - head)
+
+        changed = paragraphs[head:len(paragraphs) - tail]
+        widths = (self.widths[:head] + (measure(changed) if changed else []) +
+                  self.widths[len(self.widths) - tail:])
+        return _tokens(paragraphs, self.paragraph_sep, widths, self.space, self.height, self.fontsize)
+
+    def has_paragraph(self, idx: int) -> bool:
+        return idx < len(self.paragraphs)
+
+    def paragraph_widths(self, idx: int) -> np.ndarray:
+        return self.widths[idx]
+
+    def paragraph_spaces(self, idx: int) -> float | np.ndarray:
+        """Return the width of the space after each word of a paragraph"""
+        return self.space
+
+    def piece_offsets(self, idx_paragraph: int, first: int, last: int, offsets: np.ndarray, x_scale: float):
+        """Return the offset of each piece of the words first to last, given the offset of each word"""
+        return offsets
+
+    def finished(self, cursor) -> bool:
+        return not self.has_paragraph(cursor[0])
+
+    def leftover(self, cursor) -> str:
+        """Return the text from the (paragraph, word) cursor onwards"""
+        idx_paragraph, idx_word = cursor
+        if self.finished(cursor):
+            return ""
+        return self.paragraph_sep.join([" ".join(self.paragraphs[idx_paragraph][idx_word:])] +
+                                       [" ".join(words) for words in self.paragraphs[idx_paragraph + 1:]])
+
+
+class _styled_tokens(_tokens):
+    """
+    Tokens of styled runs: each word is made of pieces, one per style that it contains, measured with the font of
+    their style. Lines are spaced for the tallest font.
+    """
+
+    def __init__(self, paragraphs, paragraph_sep, widths, spaces, pieces, styles, space, height, fontsize):
+        super().__init__(paragraphs, paragraph_sep, widths, space, height, fontsize)
+        self.spaces: list[np.ndarray] = spaces
+        # for each paragraph and word, its (style, text, offset in points) pieces
+        self.pieces: list[list[list[tuple[int, str, float]]]] = pieces
+        self.styles: list[dict] = styles
+
+    def snapshot(self) -> dict:
+        return super().snapshot() | {'spaces': [spaces.tolist() for spaces in self.spaces],
+                                     'pieces': self.pieces,
+                                     'styles': self.styles,
+                                     }
+
+    def paragraph_spaces(self, idx: int) -> np.ndarray:
+        return self.spaces[idx]
+
+    def piece_offsets(self, idx_paragraph, first, last, offsets, x_scale):
+        return np.array([offset + piece_offset * x_scale
+                         for offset, word in zip(offsets, self.pieces[idx_paragraph][first:last])
+                         for _, _, piece_offset in word])
+
+    def line_pieces(self, idx_paragraph: int, first: int, last: int) -> list[tuple[int, str, bool]]:
+        """Return the (style, text, whether it starts a word) pieces of the words first to last"""
+        return [(style, text, idx_piece == 0)
+                for word in self.pieces[idx_paragraph][first:last]
+                for idx_piece, (style, text, _) in enumerate(word)]
+
+
+class TextStream:
+    """
+    Text read lazily from a string, an iterable of strings (such as the lines of a file), or a file-like object, to
+    be written with ParaMPL.write_stream(). Paragraphs are only read and measured when the layout reaches them, and
+    the stream keeps its position, so that the next write continues where the previous one stopped.
+
+    Parameters
+    ----------
+    source
+      text, iterable of text chunks, or object with a read() method
+    collapse_whites
+      whether multiple side-by-side withes should be considered as one
+    paragraph_per_line
+      if true, each new line is considered a new paragraph
+    chunk_size
+      number of characters read at a time from a file-like source
+
+    Attributes
+    ----------
+    position
+      (paragraph, word) of the source where the next write starts
+    """
+
+    def __init__(self,
+                 source,
+                 collapse_whites: bool = True,
+                 paragraph_per_line: bool = False,
+                 chunk_size: int = 65536,
+                 ):
+        if isinstance(source, str):
+            chunks = [source]
+        elif hasattr(source, 'read'):
+            chunks = iter(lambda: source.read(chunk_size), '')
+        else:
+            chunks = source
+
+        self._paragraphs = iter_paragraphs(chunks,
+                                           collapse_whites=collapse_whites,
+                                           paragraph_per_line=paragraph_per_line,
+                                           )
+        self.paragraph_sep: str = '\n' if paragraph_per_line else '\n\n'
+        # paragraphs read but not written yet, the first one possibly started
+        self._pending: list[list[str]] = []
+        self.position: tuple[int, int] = (0, 0)
+
+    def _read(self) -> list[str] | None:
+        paragraph = next(self._paragraphs, None)
+        return paragraph.split(' ') if paragraph is not None else None
+
+    @property
+    def finished(self) -> bool:
+        """Whether all the text was written, which may need to read the next paragraph"""
+        if not self._pending:
+            paragraph = self._read()
+            if paragraph is None:
+                return True
+            self._pending.append(paragraph)
+        return False
+
+    def read_rest(self) -> str:
+        """Return the text not written yet, reading the rest of the source"""
+        while (paragraph := self._read()) is not None:
+            self._pending.append(paragraph)
+        return self.paragraph_sep.join(" ".join(words) for words in self._pending)
+
+    def _advance(self, tokens: "_stream_tokens", cursor) -> None:
+        """Move past the text that was written, up to the (paragraph, word) cursor of the tokens"""
+        idx_paragraph, idx_word = cursor
+        self._pending = tokens.paragraphs[idx_paragraph:]
+        if self._pending:
+            self._pending[0] = self._pending[0][idx_word:]
+        self.position = (self.position[0] + idx_paragraph,
+                         idx_word + (self.position[1] if idx_paragraph == 0 else 0))
+
+
+class _stream_tokens(_tokens):
+    """Tokens read from a TextStream as the layout reaches them, each paragraph being measured when first poured"""
+
+    def __init__(self, stream: TextStream, measure, space, height, fontsize):
+        super().__init__(list(stream._pending), stream.paragraph_sep, [], space, height, fontsize)
+        self._stream = stream
+        self._measure = measure
+
+    def has_paragraph(self, idx: int) -> bool:
+        while idx >= len(self.paragraphs):
+            paragraph = self._stream._read()
+            if paragraph is None:
+                return False
+            self.paragraphs.append(paragraph)
+        return True
+
+    def paragraph_widths(self, idx: int) -> np.ndarray:
+        while len(self.widths) <= idx:
+            self.widths.append(self._measure(self.paragraphs[len(self.widths)]))
+        return self.widths[idx]
+
+    def leftover(self, cursor) -> str:
+        # the text that did not fit stays in the stream, which is not read any further
+        return ""
+
+
 class ParaMPL:
     """
     ParaMPL object is able to write justified text for a particular axes.  Default values can be fixed at
@@ -145,6 +750,16 @@ class ParaMPL:
       default text justification
     zorder
       default zorder
+    measure
+      how new words are measured: 'renderer' asks the renderer's text layout engine for each word, 'glyphs'
+      sums per-font glyph advances and kerning pairs (see GlyphAdvances for its error bound) and only falls
+      back to the renderer for math text or glyphs missing from the font
+    cache_dir
+      if given, word widths are also stored in this directory and shared with other processes using it
+    metric_cache
+      MetricCache storing the measurements in points, defaults to the process-wide parampl.metrics.shared_metrics
+    stats
+      if True, or a PhaseStats (which may be shared among instances), time each phase of the layout into .stats
     """
 
     def __init__(self,
@@ -164,6 +779,11 @@ class ParaMPL:
                  rotation: float = 0.0,
                  justify: str = "left",
                  zorder: float | None = 3,
+
+                 measure: str = 'renderer',
+                 cache_dir: str | os.PathLike | None = None,
+                 metric_cache: MetricCache | None = None,
+                 stats: bool | PhaseStats = False,
                  ):
 
         if family is None:
@@ -191,19 +811,53 @@ class ParaMPL:
         self._spacing = spacing
         self._justify = justify
 
-        self.leftover: str = ""
+        self._results = threading.local()
 
         self._axes = axes
 
-        self._renderer = axes.get_figure().canvas.get_renderer()
-        if transform == 'data':
-            self._transform = axes.transData.inverted()
-        else:
+        if transform != 'data':
             raise NotImplementedError("only 'data' transform is supported for now")
 
-        self._widths: dict[tuple, dict[str, float]] = {}
-        self._heights: dict[tuple, float] = {}
+        if measure not in ['renderer', 'glyphs']:
+            raise ValueError(f"invalid measure '{measure}'. Must be 'renderer' or 'glyphs'")
+        self._measure = measure
+
+        self._metrics = metric_cache if metric_cache is not None else shared_metrics
+        self._persistent = PersistentWidths(cache_dir) if cache_dir is not None else None
         self._rectangles: list[rectangle_specification] = []
+        self._rectangle_index: _rectangle_index | None = None
+
+        if stats is True:
+            stats = PhaseStats()
+        self.stats: PhaseStats | None = stats if stats else None
+
+    @property
+    def leftover(self) -> str:
+        """Text that did not fit in the last write(), layout(), or flow() of the calling thread"""
+        return getattr(self._results, 'leftover', "")
+
+    @leftover.setter
+    def leftover(self, leftover: str):
+        self._results.leftover = leftover
+
+    @property
+    def leftovers(self) -> list[str]:
+        """Leftover of each paragraph of the last write_many() of the calling thread"""
+        return getattr(self._results, 'leftovers', [])
+
+    @leftovers.setter
+    def leftovers(self, leftovers: list[str]):
+        self._results.leftovers = leftovers
+
+    def __getstate__(self):
+        # leftovers are kept per thread, and threads do not survive pickling
+        state = self.__dict__.copy()
+        del state['_results']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._results = threading.local()
 
     def get_axes(self):
         """Return matplotlib axes being used"""
@@ -258,32 +912,62 @@ class ParaMPL:
          top y-limit of the rectangle
         """
         self._rectangles.append((left, right, bottom, top))
+        self._rectangle_index = None
+
+        return self
+
+    def avoid_artists(self,
+                      artists: list[matplotlib.artist.Artist] | None = None,
+                      pad: float = 0.0,
+                      ):
+        """
+        Add rectangles to avoid around artists already in the axes, as avoid_rectangle_limits() does. The markers
+        of scatter plots and the points and segments of lines are avoided one by one rather than by their whole
+        extent. Extents are taken at the current limits of the axes.
+
+        Parameters
+        ----------
+        artists
+          artists to avoid, by default the lines, collections, patches, texts, legend, and inset axes of the axes
+        pad
+          margin around each artist, in points
+
+        Returns
+        -------
+           self
+        """
+        ax = self._axes
+        if artists is None:
+            artists = [*ax.lines, *ax.collections, *ax.patches, *ax.texts, *ax.child_axes]
+            if ax.get_legend() is not None:
+                artists.append(ax.get_legend())
+
+        renderer = ax.get_figure().canvas.get_renderer()
+        boxes = [_display_boxes(artist, renderer) for artist in artists if artist.get_visible()]
+        if not boxes:
+            return self
+
+        padding = renderer.points_to_pixels(pad)
+        boxes = np.concatenate(boxes) + [-padding, -padding, padding, padding]
+        corners = ax.transData.inverted().transform(boxes.reshape(-1, 2)).reshape(-1, 4)
+        for x0, y0, x1, y1 in corners.tolist():
+            self.avoid_rectangle_limits(min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1))
 
         return self
 
     def reset_rectangles(self):
         """Reset avoidance rectangles"""
         self._rectangles = []
+        self._rectangle_index = None
 
         return self
 
-    def _check_max_leftover(self, max_height, paragraph_sep, lp,
-                            left_words=None, left_paragraphs=None):
-        check = max_height is not None and lp.total_height() - lp.delta_y > max_height
-
-        if check:
-            if left_words is None:
-                left_words = []
-            if left_paragraphs is None:
-                left_paragraphs = []
-
-            self.leftover = paragraph_sep.join([" ".join(left_words)] +
-                                               left_paragraphs)
-
-        return check
+    def cache_info(self) -> dict[str, int]:
+        """Return hits, misses, evictions, and size of the in-memory word-width cache"""
+        return self._metrics.cache_info()
 
     def write(self,
-              text: str,
+              text: str | list[run_specification],
               xy: tuple[float, float],
 
               width: float | None = None,
@@ -300,6 +984,7 @@ class ParaMPL:
               rotation: float | None = None,
               justify: str | None = None,
               zorder: float | None = None,
+              linebreak: str = 'greedy',
 
               ha: str = 'left',
               va: str = 'top',
@@ -310,14 +995,19 @@ class ParaMPL:
 
               collapse_whites: bool = True,
               paragraph_per_line: bool = False,
-              ) -> tuple[list[matplotlib.artist.Artist], float]:
+
+              fit: str | None = None,
+              min_fontsize: float = 1.0,
+              ) -> WrittenParagraph:
         """
 Write text into a paragraph, storing word length in dictionary cache. Return a list to all artists
 
         Parameters
         ----------
         text:
-          text to write
+          text to write, or a list of styled runs: each either text, or (text, properties) where properties is a
+          dictionary with any of fontname, fontsize, family, weight, style, and color that differ from the
+          paragraph's. Runs are laid out in a single pass, with one artist per line and style
         xy:
            position to place the paragraph aligned according to ha and va
         width:
@@ -345,6 +1035,8 @@ Write text into a paragraph, storing word length in dictionary cache. Return a l
           Line's justification
         zorder:
           Text's zorder
+        linebreak:
+          'greedy' fills each line as much as possible, 'optimal' minimizes the raggedness of the whole paragraph
 
         ha:
           Paragraph horizontal alignment
@@ -363,13 +1055,470 @@ Write text into a paragraph, storing word length in dictionary cache. Return a l
         paragraph_per_line
           if true, each new line is considered a new paragraph
 
+        fit
+          'shrink' reduces fontsize down to min_fontsize until the text fits width and max_height (see fit_fontsize)
+        min_fontsize
+          smallest fontsize tried by fit='shrink'
+
         Returns
         -------
-        list[Artist]
+        WrittenParagraph
+          unpacks as (list of artists, total height), and can be updated with new text, after which it unpacks
+          as the current ones
+
+        """
+        kwargs = dict(width=width, spacing=spacing, max_height=max_height,
+                      fontname=fontname, fontsize=fontsize, family=family, weight=weight, style=style,
+                      color=color, rotation=rotation, justify=justify, zorder=zorder,
+                      linebreak=linebreak,
+                      ha=ha, va=va,
+                      avoid_left_of=avoid_left_of, avoid_right_of=avoid_right_of,
+                      avoid_rectangles=avoid_rectangles,
+                      collapse_whites=collapse_whites, paragraph_per_line=paragraph_per_line,
+                      fit=fit, min_fontsize=min_fontsize,
+                      )
+        layout = self._lay_out(text, xy, **kwargs)
+
+        artists = self._new_texts(layout)
+        for artist in artists:
+            self._axes._add_text(artist)
+
+        return WrittenParagraph(self, layout, artists, xy, kwargs, text)
+
+    def write_many(self,
+                   items: list[tuple[str, tuple[float, float]] | tuple[str, tuple[float, float], dict]],
+                   **kwargs,
+                   ) -> list[WrittenParagraph]:
+        """
+        Write many paragraphs at once, such as labels or annotations. The new words of each font are measured in
+        a single batch, the scale and aspect of the axes are computed once for all the paragraphs, and the
+        artists are added to the axes after all of them were laid out.
+
+        Parameters
+        ----------
+        items:
+          sequence of (text, xy) or (text, xy, overrides), where overrides is a dictionary of arguments of write()
+          that apply to that paragraph only
+        **kwargs
+          any other argument accepted by write(), for all the paragraphs
+
+        Returns
+        -------
+        list[WrittenParagraph]
+          the written paragraphs, as returned by write(). The text that did not fit in each paragraph is stored in
+          the .leftovers attribute
+        """
+        items = [(item[0], item[1], kwargs | (item[2] if len(item) > 2 else {}))
+                 for item in items]
+
+        # measure all the new words of each font together
+        words_per_font = {}
+        for text, xy, options in items:
+            if not isinstance(text, str):  # styled runs are measured per style when laid out
+                continue
+            props = {k: options.get(k) if options.get(k) is not None else self._text_props[k]
+                     for k in ['fontname', 'fontsize', 'family', 'weight', 'style']}
+            paragraphs, _ = split_into_paragraphs(text,
+                                                  collapse_whites=options.get('collapse_whites', True),
+                                                  paragraph_per_line=options.get('paragraph_per_line', False),
+                                                  )
+            font = words_per_font.setdefault(tuple(props.items()), (props, {}))
+            font[1].update(dict.fromkeys(word for paragraph in paragraphs for word in paragraph.split(' ')))
+        for props, words in words_per_font.values():
+            self._get_metrics(props, words=list(words))
+
+        geometry = self._geometry()
+        clip = self._clip()
+        layouts = []
+        self.leftovers = []
+        for text, xy, options in items:
+            layouts.append(self._lay_out(text, xy, geometry=geometry, **options))
+            self.leftovers.append(self.leftover)
+
+        ret = []
+        for (text, xy, options), layout in zip(items, layouts):
+            artists = self._new_texts(layout, clip=clip)
+            for artist in artists:
+                self._axes._add_text(artist)
+            ret.append(WrittenParagraph(self, layout, artists, xy, options, text))
+
+        return ret
+
+    def write_stream(self,
+                     source,
+                     xy: tuple[float, float],
+                     **kwargs,
+                     ) -> tuple[list[Text], float, TextStream]:
+        """
+        Write text read lazily from a file or an iterable, such as a generator of lines. Paragraphs are read and
+        measured only as the layout reaches them, so that writing into a frame with max_height stops reading once
+        the frame is full. The returned stream continues where the text stopped, and can be written into the
+        next frame with another call.
+
+        Parameters
+        ----------
+        source:
+          TextStream, or any source accepted by TextStream
+        xy:
+           position to place the paragraph aligned according to ha and va
+        **kwargs
+          any other argument accepted by write(), except fit. collapse_whites and paragraph_per_line only apply
+          when creating a TextStream from the source
 
+        Returns
+        -------
+        tuple[list[Text], float, TextStream]
+          the artists, the total height of the written text, and the stream positioned after it
         """
-        # todo: optimize max_height
+        if not isinstance(source, TextStream):
+            source = TextStream(source,
+                                collapse_whites=kwargs.get('collapse_whites', True),
+                                paragraph_per_line=kwargs.get('paragraph_per_line', False),
+                                )
+
+        layout = self._lay_out(source, xy, **kwargs)
+        artists = self._new_texts(layout)
+        for artist in artists:
+            self._axes._add_text(artist)
+
+        return artists, layout.total_height, source
+
+    def add_paragraph(self,
+                      text: str,
+                      xy: tuple[float, float],
+                      **kwargs,
+                      ) -> ParagraphArtist:
+        """
+        Add a paragraph whose layout is computed at draw time, and recomputed only when the axes scale changes
+        (zoom, resize, DPI change) so that the text keeps its size in points, or when the font or the rcParams
+        that change the widths of words do.
 
+        Parameters
+        ----------
+        text:
+          text to write
+        xy:
+           position to place the paragraph aligned according to ha and va
+        **kwargs
+          any other argument accepted by write()
+
+        Returns
+        -------
+        ParagraphArtist
+        """
+        paragraph = ParagraphArtist(self, text, xy, **kwargs)
+
+        zorder = kwargs.get('zorder', self._text_props['zorder'])
+        if zorder is not None:
+            paragraph.set_zorder(zorder)
+
+        return self._axes.add_artist(paragraph)
+
+    def animate(self,
+                text: str,
+                xy: tuple[float, float],
+                pool_size: int | None = None,
+                **kwargs,
+                ) -> AnimatedParagraph:
+        """
+        Lay out a paragraph once, to be revealed or scrolled frame by frame through a fixed pool of animated
+        artists (see AnimatedParagraph)
+
+        Parameters
+        ----------
+        text:
+          text to animate
+        xy:
+           position to place the paragraph aligned according to ha and va
+        pool_size:
+          number of artists for each kind of line, defaults to the lines that fit in the axes
+        **kwargs
+          any other argument accepted by write()
+
+        Returns
+        -------
+        AnimatedParagraph
+        """
+        return AnimatedParagraph(self, text, xy, pool_size=pool_size, **kwargs)
+
+    def replay(self,
+               path: str | os.PathLike,
+               xy: tuple[float, float] | None = None,
+               ) -> WrittenParagraph:
+        """
+        Write a paragraph saved by WrittenParagraph.save(). Its layout is rebuilt from the snapshot, without
+        measuring nor breaking lines, if it was saved with the same parampl version and fonts (font files,
+        properties, DPI, and measure mode), and if the frame, avoid regions, and rectangles to avoid have the same
+        size and place in points relative to xy. Otherwise, the text is written again with write().
+
+        Parameters
+        ----------
+        path:
+          snapshot file
+        xy:
+          position of the paragraph, defaults to the one it was saved with
+
+        Returns
+        -------
+        WrittenParagraph
+          as returned by write(), and can be updated or saved in the same way
+        """
+        with open(path) as fp:
+            snapshot = json.load(fp)
+
+        text = snapshot['text']
+        xy = tuple(snapshot['xy']) if xy is None else xy
+        kwargs = snapshot['kwargs'] | {name: _avoid_from_json(snapshot['kwargs'].get(name))
+                                       for name in ['avoid_left_of', 'avoid_right_of']}
+        if snapshot['key'] != self._snapshot_key(text, xy, kwargs):
+            return self.write(text, xy, **kwargs)
+
+        layout = self._layout_from_snapshot(snapshot['layout'], xy)
+        artists = self._new_texts(layout)
+        for artist in artists:
+            self._axes._add_text(artist)
+
+        self.leftover = layout.leftover
+        return WrittenParagraph(self, layout, artists, xy, kwargs, text)
+
+    def _snapshot(self, text, xy, kwargs, layout: Layout) -> dict:
+        """Return the JSON-able snapshot of a layout, with its runs in points relative to xy"""
+        x_scale, y_scale = self._points_to_data()
+        runs = {'x': ((layout.x - xy[0]) / x_scale).tolist(),
+                'y': ((layout.y - xy[1]) / y_scale).tolist(),
+                'positions': [None if positions is None else (np.asarray(positions) / (x_scale, y_scale)).tolist()
+                              for positions in layout._positions],
+                'lengths': [None if length is None else length / x_scale for length in layout._lengths],
+                } | {name: getattr(layout, name).tolist() for name in ['line', 'paragraph', 'start', 'stop']}
+
+        return {'key': self._snapshot_key(text, xy, kwargs),
+                'text': _jsonable(text),
+                'xy': list(xy),
+                'kwargs': _jsonable(kwargs),
+                'layout': _jsonable({'props': layout._props,
+                                     'tokens': layout._tokens.snapshot(),
+                                     'runs': runs,
+                                     'total_height': layout.total_height / y_scale,
+                                     'y_offset': layout._y_offset / y_scale,
+                                     'overflow': layout.overflow,
+                                     }),
+                }
+
+    def _layout_from_snapshot(self, snapshot: dict, xy) -> Layout:
+        """Return the layout stored by _snapshot(), placed at xy"""
+        x_scale, y_scale = self._points_to_data()
+        y_offset = snapshot['y_offset'] * y_scale
+
+        stored = snapshot['runs']
+        runs = _runs(snapshot['props'])
+        for idx, (x, y) in enumerate(zip(stored['x'], stored['y'])):
+            positions, length = stored['positions'][idx], stored['lengths'][idx]
+            if positions is not None:
+                positions = np.array(positions).reshape(-1, 2) * (x_scale, y_scale)
+            runs.add(xy[0] + x * x_scale, xy[1] + y * y_scale - y_offset,
+                     stored['line'][idx], stored['paragraph'][idx], stored['start'][idx], stored['stop'][idx],
+                     positions=positions, length=None if length is None else length * x_scale)
+
+        overflow = snapshot['overflow']
+        return Layout(runs, _tokens.from_snapshot(snapshot['tokens']), snapshot['total_height'] * y_scale, y_offset,
+                      overflow=None if overflow is None else tuple(overflow))
+
+    def _snapshot_key(self, text, xy, kwargs) -> dict:
+        """Return what a snapshot's layout depends on besides its text, in points relative to xy and rounded"""
+        import parampl
+
+        x_scale, y_scale = self._points_to_data()
+        props = {k: kwargs.get(k) if kwargs.get(k) is not None else v for k, v in self._text_props.items()}
+        width = kwargs.get('width') if kwargs.get('width') is not None else self._width
+        max_height = kwargs.get('max_height')
+
+        def relative(specification):
+            if specification is None:
+                return None
+            if not isinstance(specification, list):
+                specification = [specification]
+            return [(x_limit if x_limit is None else (x_limit - xy[0]) / x_scale,
+                     ((y1 - xy[1]) / y_scale, (y2 - xy[1]) / y_scale))
+                    for x_limit, (y1, y2) in specification]
+
+        # every style, so that a changed font file or a new matplotlib version forces a fresh layout
+        text_styles = [props] + [props | run[1] for run in ([] if isinstance(text, str) else text)
+                                 if not isinstance(run, str)]
+        dpi = self._axes.get_figure().dpi
+
+        key = {'format': 2,
+               'parampl': parampl.__version__,
+               'fonts': [PersistentWidths.font_key(_font_properties(style), dpi, self._measure)
+                         for style in text_styles],
+               'props': props,
+               'width': width / x_scale,
+               'max_height': None if max_height is None else max_height / y_scale,
+               'spacing': kwargs.get('spacing') if kwargs.get('spacing') is not None else self._spacing,
+               'justify': kwargs.get('justify') if kwargs.get('justify') is not None else self._justify,
+               'avoid_left_of': relative(kwargs.get('avoid_left_of')),
+               'avoid_right_of': relative(kwargs.get('avoid_right_of')),
+               'rectangles': ([((left - xy[0]) / x_scale, (right - xy[0]) / x_scale,
+                                (bottom - xy[1]) / y_scale, (top - xy[1]) / y_scale)
+                               for left, right, bottom, top in self._rectangles]
+                              if kwargs.get('avoid_rectangles', True) else None),
+               # the aspect only shapes rotated text
+               'aspect': get_aspect(self._axes) if props['rotation'] else None,
+               'kwargs': {k: v for k, v in kwargs.items()
+                          if k not in ['width', 'max_height', 'spacing', 'justify',
+                                       'avoid_left_of', 'avoid_right_of']
+                          and k not in self._text_props},
+               }
+        return _jsonable(key, digits=9)
+
+    def layout(self,
+               text: str,
+               xy: tuple[float, float],
+               **kwargs,
+               ) -> Layout:
+        """
+        Lay out text exactly as write() would, without creating any artist. Useful to check whether text fits,
+        or to compare candidate layouts, before committing to one.
+
+        Several threads can lay out text at once, with the same or different ParaMPL instances, as the layout
+        state is kept per call, the metric cache is locked, and words are measured with a renderer of the calling
+        thread rather than in the axes. The .leftover attribute is kept per thread, and holds the leftover of the
+        last call in the calling thread, as does the returned Layout.
+
+        Parameters
+        ----------
+        text:
+          text to write
+        xy:
+           position to place the paragraph aligned according to ha and va
+        **kwargs
+          any other argument accepted by write()
+
+        Returns
+        -------
+        Layout
+          position, line, paragraph, and word range of each run, total height, and overflow position
+        """
+        return self._lay_out(text, xy, **kwargs)
+
+    def fit_fontsize(self,
+                     text: str,
+                     xy: tuple[float, float],
+                     width: float | None = None,
+                     max_height: float | None = None,
+                     min_fontsize: float = 1.0,
+                     **kwargs,
+                     ) -> float:
+        """
+        Return the largest fontsize, not above the requested one, at which the text fits width and max_height.
+        Words are measured once at the requested fontsize, and the search rescales those widths, which are
+        almost proportional to the fontsize. Only the final candidate is measured again to confirm that it fits,
+        stepping down by 0.1 points if font hinting made it slightly wider.
+
+        Parameters
+        ----------
+        text:
+          text to write
+        xy:
+           position to place the paragraph aligned according to ha and va
+        width:
+           width of paragraph
+        max_height:
+           maximum height of paragraph
+        min_fontsize:
+          smallest fontsize to return, even if the text does not fit. The requested fontsize is returned if it is
+          smaller
+        **kwargs
+          any other argument accepted by write(). fontsize is the largest size returned
+
+        Returns
+        -------
+        float
+          fontsize in points
+        """
+        return self._lay_out(text, xy, width=width, max_height=max_height,
+                             fit='shrink', min_fontsize=min_fontsize, **kwargs).fontsize
+
+    def flow(self,
+             text: str,
+             frames: list[frame_specification | tuple["ParaMPL", tuple[float, float], float, float | None]],
+             **kwargs,
+             ) -> list[list[matplotlib.artist.Artist]]:
+        """
+        Pour text through a sequence of frames, such as columns or panels, each one continuing where the previous
+        one overflowed. The text is split into words and measured only once for all the frames.
+
+        Parameters
+        ----------
+        text:
+          text to write
+        frames:
+          sequence of (xy, width, max_height), or of (parampl, xy, width, max_height) to place a frame in the axes
+          of another ParaMPL instance. A max_height of None lets the frame take all the remaining text
+        **kwargs
+          any other argument accepted by write()
+
+        Returns
+        -------
+        list[list[Artist]]
+          artists of each frame. Text that did not fit in any frame is stored in the .leftover attribute
+        """
+        frames = [frame if isinstance(frame[0], ParaMPL) else (self, *frame)
+                  for frame in frames]
+
+        artists = []
+        for target, layout in self._flow(text, frames, **kwargs):
+            artists.append(target._new_texts(layout))
+            for artist in artists[-1]:
+                target._axes._add_text(artist)
+
+        return artists + [[] for _ in range(len(frames) - len(artists))]
+
+    def _lay_out(self,
+                 text: "str | list[run_specification] | TextStream",
+                 xy: tuple[float, float],
+                 width: float | None = None,
+                 max_height: float | None = None,
+                 **kwargs,
+                 ) -> Layout:
+        """Lay out the paragraphs as write() does"""
+        (_, layout), = self._flow(text, [(self, xy, width, max_height)], **kwargs)
+        return layout
+
+    def _flow(self,
+              text: "str | list[run_specification] | TextStream",
+              frames: list[tuple["ParaMPL", tuple[float, float], float | None, float | None]],
+
+              spacing: float | None = None,
+
+              fontname: str | None = None,
+              fontsize: float | None = None,
+              family: str | None = None,
+              weight: str | None = None,
+              style: str | None = None,
+
+              color: str | None = None,
+              rotation: float | None = None,
+              justify: str | None = None,
+              zorder: float | None = None,
+              linebreak: str = 'greedy',
+
+              ha: str = 'left',
+              va: str = 'top',
+
+              avoid_left_of: avoid_specification = None,
+              avoid_right_of: avoid_specification = None,
+              avoid_rectangles: bool = True,
+
+              collapse_whites: bool = True,
+              paragraph_per_line: bool = False,
+
+              fit: str | None = None,
+              min_fontsize: float = 1.0,
+              geometry: tuple[float, float, float] | None = None,
+              resume: tuple[tuple[int, int], int] | None = None,
+              tokens: _tokens | None = None,
+              ) -> list[tuple["ParaMPL", Layout]]:
+        """Lay out the text through the frames, returning the target and the layout of each"""
         props = {'fontname': fontname,
 
                  'fontsize': fontsize,
@@ -384,193 +1533,597 @@ Write text into a paragraph, storing word length in dictionary cache. Return a l
 
         props = {k: v if v is not None else self._text_props[k]
                  for k, v in props.items()}
-        rotation = props['rotation']
 
         # these affect the format of the paragraph
-        if width is None:
-            width = self._width
         if spacing is None:
             spacing = self._spacing
         if justify is None:
             justify = self._justify
+        if linebreak not in ['greedy', 'optimal']:
+            raise ValueError(f"invalid linebreak '{linebreak}'. Must be 'greedy' or 'optimal'")
+        if fit not in [None, 'shrink']:
+            raise ValueError(f"invalid fit '{fit}'. Must be None or 'shrink'")
+
+        # separate paragraphs into words and measure them once for all the frames, unless already done
+        if tokens is not None:
+            pass
+        elif isinstance(text, TextStream):
+            if fit is not None:
+                raise NotImplementedError("fit='shrink' needs the whole text, it is not available for a TextStream")
+            tokens = self._stream_tokens(text, props)
+        elif not isinstance(text, str):
+            if fit is not None:
+                raise NotImplementedError("fit='shrink' is not available for styled runs")
+            tokens = self._tokenize_runs(text, props, collapse_whites, paragraph_per_line)
+        else:
+            with self._phase('split') as info:
+                paragraphs, paragraph_sep = split_into_paragraphs(text,
+                                                                  collapse_whites=collapse_whites,
+                                                                  paragraph_per_line=paragraph_per_line,
+                                                                  )
+                paragraphs = [paragraph.split(' ') for paragraph in paragraphs]
+                info['paragraphs'] = len(paragraphs)
+            tokens = self._tokenize(paragraphs, paragraph_sep, props)
+
+        frames = [(target, xy, width if width is not None else target._width, max_height)
+                  for target, xy, width, max_height in frames]
+        pour_args = (spacing, justify, linebreak, ha, va, avoid_left_of, avoid_right_of, avoid_rectangles, geometry)
+        if fit == 'shrink':
+            tokens = self._shrink_to_fit(tokens, props, frames, min_fontsize, pour_args)
+            props['fontsize'] = tokens.fontsize
 
-        ax = self._axes
-
-        # old artists are already present in the axes and won't be moved by the posteriori vertical alignment
-        old_artists = list(ax.texts)
+        if props['fontname'] is None:
+            del props['fontname']
 
-        if ax.get_ylim()[1] < ax.get_ylim()[0] or ax.get_xlim()[1] < ax.get_xlim()[0]:
-            raise NotImplementedError("paraMPL.write() is only available for plots with increasing x- and y-axis")
+        poured, cursor = self._pour_frames(tokens, frames, props, pour_args, resume=resume)
+        self.leftover = tokens.leftover(cursor)
+        if isinstance(text, TextStream):
+            text._advance(tokens, cursor)
+
+        layouts = []
+        for target, lp, runs, stop in poured:
+            with self._phase('align'):
+                layouts.append((target, Layout(runs, tokens, lp.total_height(), self._vertical_offset(lp, va),
+                                               overflow=None if tokens.finished(stop) else stop)))
+
+        return layouts
+
+    def _tokenize(self, paragraphs, paragraph_sep, props) -> _tokens:
+        """Measure the words of the paragraphs"""
+        widths, height, combined_hash = self._get_metrics(props,
+                                                          words=[word for words in paragraphs for word in words])
+        return _tokens(paragraphs, paragraph_sep,
+                       [np.fromiter(map(widths.__getitem__, words), float, len(words)) for words in paragraphs],
+                       widths[' '], height, self._metrics.fonts[combined_hash][0].get_size_in_points())
+
+    def _tokenize_runs(self, runs: list[run_specification], props, collapse_whites, paragraph_per_line
+                       ) -> _styled_tokens:
+        """Split styled runs into words, and measure the pieces of each style with its font"""
+        styles, indexed = [dict(props)], []
+        for run in runs:
+            run_text, overrides = (run, {}) if isinstance(run, str) else run
+            if invalid := set(overrides) - set(style_keys):
+                raise ValueError(f"invalid run properties {sorted(invalid)}. Must be among {style_keys}")
+            style = props | overrides
+            if style not in styles:
+                styles.append(style)
+            indexed.append((run_text, styles.index(style)))
+
+        with self._phase('split') as info:
+            paragraphs, paragraph_sep = split_runs_into_paragraphs(indexed or [('', 0)],
+                                                                   collapse_whites=collapse_whites,
+                                                                   paragraph_per_line=paragraph_per_line,
+                                                                   )
+            info['paragraphs'] = len(paragraphs)
+
+        texts = [[] for _ in styles]
+        for paragraph in paragraphs:
+            for word in paragraph:
+                for style, text in word:
+                    texts[style].append(text)
+        metrics = [self._get_metrics(style, words=style_texts) for style, style_texts in zip(styles, texts)]
+
+        widths, spaces, pieces = [], [], []
+        for paragraph in paragraphs:
+            paragraph_widths, paragraph_pieces = [], []
+            for word in paragraph:
+                offset = 0.0
+                word_pieces = []
+                for style, text in word:
+                    word_pieces.append((style, text, offset))
+                    offset += metrics[style][0][text]
+                paragraph_widths.append(offset)
+                paragraph_pieces.append(word_pieces)
+            widths.append(np.array(paragraph_widths, dtype=float))
+            spaces.append(np.array([metrics[word[-1][0]][0][' '] for word in paragraph], dtype=float))
+            pieces.append(paragraph_pieces)
+
+        words = [[''.join(text for _, text in word) for word in paragraph] for paragraph in paragraphs]
+        return _styled_tokens(words, paragraph_sep, widths, spaces, pieces, styles, metrics[0][0][' '],
+                              max(height for _, height, _ in metrics), props['fontsize'])
+
+    def _stream_tokens(self, stream: TextStream, props) -> _stream_tokens:
+        """Return tokens that read and measure the paragraphs of the stream as they are poured"""
+        props = dict(props)  # _flow drops an unset fontname before pouring
+        space_widths, height, combined_hash = self._get_metrics(props)
+
+        def measure(words):
+            widths = self._get_metrics(props, words=words)[0]
+            return np.fromiter(map(widths.__getitem__, words), float, len(words))
+
+        return _stream_tokens(stream, measure, space_widths[' '], height,
+                              self._metrics.fonts[combined_hash][0].get_size_in_points())
+
+    def _pour_frames(self, tokens, frames, props, pour_args, resume=None):
+        """Pour the tokens through the frames until they are finished, returning what went into each and the cursor.
+        resume=(cursor, lines) starts the first frame at cursor, after its first `lines` lines"""
+        poured = []
+        cursor, lines = resume if resume is not None else ((0, 0), 0)
+        spacing, *format_args = pour_args
+        for target, xy, width, max_height in frames:
+            lp, runs, cursor = target._pour(tokens, cursor, xy, width, spacing, max_height, props, *format_args,
+                                            lines=lines)
+            poured.append((target, lp, runs, cursor))
+            lines = 0
+
+            if tokens.finished(cursor):
+                break
+
+        return poured, cursor
+
+    def _fits(self, tokens, frames, props, pour_args) -> bool:
+        """Whether the tokens go through the frames without overflowing them, nor their width"""
+        if any(tokens.widest() * target._points_to_data()[0] > width for target, xy, width, max_height in frames):
+            return False
+        return tokens.finished(self._pour_frames(tokens, frames, props, pour_args)[1])
+
+    def _shrink_to_fit(self, tokens, props, frames, min_fontsize, pour_args) -> _tokens:
+        """Return the tokens measured at the largest fontsize, on a 0.1-point grid, that fits the frames"""
+        if tokens.fontsize <= min_fontsize or self._fits(tokens, frames, props, pour_args):
+            return tokens
+
+        # bisect over the scaled widths, which are almost proportional to the fontsize
+        step = 0.1
+        low = int(np.ceil(min_fontsize / step))
+        high = int(np.ceil(tokens.fontsize / step)) - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self._fits(tokens.scaled(mid * step / tokens.fontsize), frames, props, pour_args):
+                low = mid
+            else:
+                high = mid - 1
+
+        # then measure the candidate exactly, stepping down while hinting makes it overflow
+        while True:
+            candidate = self._tokenize(tokens.paragraphs, tokens.paragraph_sep,
+                                       props | {'fontsize': round(low * step, 1)})
+            if low * step <= min_fontsize or self._fits(candidate, frames, props, pour_args):
+                return candidate
+            low -= 1
+
+    def _pour(self, tokens, cursor,
+              xy, width, spacing, max_height,
+              props, justify, linebreak, ha, va,
+              avoid_left_of, avoid_right_of, avoid_rectangles,
+              geometry=None, lines=0,
+              ) -> tuple[_line_position, _runs, tuple[int, int]]:
+        """Lay out the tokens from cursor into one frame of this axes, returning the cursor where it stopped"""
+        rotation = props['rotation']
 
-        # word size info
-        widths, height, combined_hash = self._get_widths_height(props,
-                                                                words=text.split())
-        space_width = widths[' ']
+        # word size info in data units
+        if geometry is None:
+            geometry = self._geometry()
+        x_scale, y_scale, aspect = geometry
 
-        # initialize position-storing object
-        lp = _line_position(xy, width, height,
-                            rotation, spacing, ha, justify,
-                            y_to_x_ratio=get_aspect(ax))
+        with self._phase('borders'):
+            # initialize position-storing object
+            lp = _line_position(xy, width, tokens.height * y_scale,
+                                rotation, spacing, ha, justify,
+                                y_to_x_ratio=aspect)
 
-        # add rectangles to avoid if orientation and alignment is adequate
-        if va == 'top' and rotation == 0 and ha == 'left':
-            if avoid_rectangles:
-                lp.add_rectangles(self._rectangles)
-        # if orientation is not adequate, but avoid is specified raise error
-        elif avoid_left_of is not None or avoid_right_of is not None:
-            raise ValueError("if using avoid areas, then va='top', ha='left', and rotation=0 are required")
+            # add rectangles to avoid if orientation and alignment is adequate
+            if va == 'top' and rotation == 0 and ha == 'left':
+                if avoid_rectangles:
+                    lp.add_rectangles(self._rectangles_in_frame(xy, width, max_height, tokens.height * y_scale))
+            # if orientation is not adequate, but avoid is specified raise error
+            elif avoid_left_of is not None or avoid_right_of is not None:
+                raise ValueError("if using avoid areas, then va='top', ha='left', and rotation=0 are required")
 
-        lp.add_avoids(avoid_left_of, avoid_right_of, initialize=True)
+            lp.add_avoids(avoid_left_of, avoid_right_of, initialize=True)
 
-        # separate and process paragraphs one at a time.
-        paragraphs, paragraph_sep = split_into_paragraphs(text,
-                                                          collapse_whites=collapse_whites,
-                                                          paragraph_per_line=paragraph_per_line,
-                                                          )
+            runs = _runs(props)
 
-        if props['fontname'] is None:
-            del props['fontname']
+            # skip the lines already written when resuming
+            for _ in range(lines):
+                lp.next_line()
 
-        for idx_paragraph, paragraph in enumerate(paragraphs):
-            words = []
-            length = 0
-
-            # if full justified add word-by-word size and when line is completed, fill with space
-            if justify == 'full':
-                incoming_words = paragraph.split(' ')
-                for idx, word in enumerate(incoming_words):
-                    if length + widths[word] > lp.width_line:
-                        if len(words) > 1:
-                            extra_spacing = (lp.width_line - length + space_width) / (len(words) - 1)
-                        else:
-                            extra_spacing = 0
-
-                        offset = 0
-                        for word_out in words:
-                            x, y = lp.offset(offset=offset)
-                            ax.text(x, y, word_out, **props)
-                            offset += extra_spacing + space_width + widths[word_out]
-
-                        if self._check_max_leftover(max_height, paragraph_sep, lp,
-                                                    left_words=incoming_words[idx:],
-                                                    left_paragraphs=paragraphs[idx_paragraph + 1:]
-                                                    ):
-                            return self._artists_and_vertical_align(old_artists, lp, va)
-
-                        lp.next_line()
-                        length = 0
-                        words = []
-
-                    length += widths[word] + space_width
-                    words.append(word)
-
-                # if for reaches the end (no max_height)
-                else:
-                    x, y = lp.offset()
-                    ax.text(x, y, ' '.join(words),
-                            **props)
-
-                    if self._check_max_leftover(max_height, paragraph_sep, lp,
-                                                left_paragraphs=paragraphs[idx_paragraph + 1:]
-                                                ):
-                        return self._artists_and_vertical_align(old_artists, lp, va)
+        with self._phase('breaks'):
+            # process paragraphs one at a time.
+            n_line = lines
+            idx_paragraph, first = cursor
+            while tokens.has_paragraph(idx_paragraph):
+                words = tokens.paragraphs[idx_paragraph]
+                starts, ends = cumulative_widths(tokens.paragraph_widths(idx_paragraph) * x_scale,
+                                                 tokens.paragraph_spaces(idx_paragraph) * x_scale)
+
+                if linebreak == 'optimal':
+                    breaks = iter(np.add(optimal_breaks(starts[first:], ends[first:], lp.width_ahead), first))
+
+                while first < len(words):
+                    if linebreak == 'optimal':
+                        last = int(next(breaks))
+                    else:
+                        last = line_break(starts, ends, first, lp.width_line)
+                    n_words = last - first
+                    length = ends[last - 1] - starts[first]
+
+                    # if full justified, except on the paragraph's last line, distribute the spare space between
+                    # words
+                    if justify == 'full' and last < len(words):
+                        extra_spacing = (lp.width_line - length) / (n_words - 1) if n_words > 1 else 0
+                        offsets = starts[first:last] - starts[first] + extra_spacing * np.arange(n_words)
+                        offsets = tokens.piece_offsets(idx_paragraph, first, last, offsets, x_scale)
+
+                        # the whole line is drawn by a single artist
+                        positions = np.column_stack(lp.offset(offset=offsets))
+                        x, y = positions[0]
+                        runs.add(x, y, n_line, idx_paragraph, first, last,
+                                 positions=positions - (x, y), length=lp.width_line)
+
+                    # styled pieces are placed where they were measured, to be drawn by one artist per style
+                    elif tokens.styles is not None:
+                        offsets = tokens.piece_offsets(idx_paragraph, first, last,
+                                                       starts[first:last] - starts[first], x_scale)
+                        positions = np.column_stack(lp.offset(offset=offsets, justified_length=length))
+                        x, y = positions[0]
+                        runs.add(x, y, n_line, idx_paragraph, first, last,
+                                 positions=positions - (x, y), length=length)
+
+                    # otherwise write the whole line then move it.
+                    else:
+                        x, y = lp.offset(justified_length=length)
+                        runs.add(x, y, n_line, idx_paragraph, first, last)
+
+                    # stop if there is no room for another line
+                    if max_height is not None and lp.total_height() - (lp.next_y() - lp.y) > max_height:
+                        if last < len(words):
+                            return lp, runs, (idx_paragraph, last)
+                        return lp, runs, (idx_paragraph + 1, 0)
 
                     lp.next_line()
-                    self.leftover = ""
+                    n_line += 1
+                    first = last
 
-            # if left, right, center justified then write the whole line then move it.
-            else:
-                for idx, word in enumerate(paragraph.split(' ')):
-                    if length + widths[word] > lp.width_line:
-                        x, y = lp.offset(justified_length=length - space_width)
-                        ax.text(x, y, ' '.join(words),
-                                **props)
-                        lp.next_line()
-                        length, words = 0, []
-
-                        if self._check_max_leftover(max_height, paragraph_sep, lp,
-                                                    left_words=paragraph.split(' ')[idx+1:],
-                                                    left_paragraphs=paragraphs[idx_paragraph + 1:]
-                                                    ):
-                            return self._artists_and_vertical_align(old_artists, lp, va)
-
-                    length += widths[word] + space_width
-                    words.append(word)
-
-                x, y = lp.offset(justified_length=length - space_width)
-                ax.text(x, y, ' '.join(words),
-                        **props)
-
-                if self._check_max_leftover(max_height, paragraph_sep, lp,
-                                            left_paragraphs=paragraphs[idx_paragraph + 1:]
-                                            ):
-                    return self._artists_and_vertical_align(old_artists, lp, va)
-
-                lp.next_line()
+                first = 0
+                idx_paragraph += 1
 
-        return self._artists_and_vertical_align(old_artists, lp, va)
+            return lp, runs, (idx_paragraph, 0)
 
-    def _artists_and_vertical_align(self, old_artists, lp, va):
-        ax = self._axes
-        # get list of artists generated for these paragraphs.
-        parampl_artists = [artist for artist in ax.texts if artist not in old_artists]
+    def _new_text(self, x, y, words, props, positions=None, length=None, clip=None):
+        """
+        Create a Text with the defaults of Axes.text(), or a JustifiedText if word positions are given. Both
+        rotate around their baseline start, so that rotated lines of either kind align.
+        """
+        kwargs = {'verticalalignment': 'baseline',
+                  'horizontalalignment': 'left',
+                  'rotation_mode': 'anchor',
+                  'transform': self._axes.transData,
+                  'clip_on': False,
+                  } | props
+        if positions is None:
+            artist = Text(x, y, ' '.join(words), **kwargs)
+        else:
+            artist = JustifiedText(x, y, words, positions, length, **kwargs)
 
-        # once all paragraphs are finished, do the vertical alignment
+        if clip is None:
+            clip = self._clip()
+        if isinstance(clip, BboxBase):
+            artist.set_clip_box(clip)
+        else:
+            artist.set_clip_path(clip)
+
+        return artist
+
+    def _new_texts(self, layout: Layout, clip=None) -> list[Text]:
+        """Create the Text artists of a layout, at their final position"""
+        with self._phase('artists') as info:
+            if clip is None:
+                clip = self._clip()
+            texts = [self._new_text(*spec, clip=clip) for spec in self._text_specs(layout)]
+            info['artists'] = len(texts)
+            return texts
+
+    @staticmethod
+    def _text_specs(layout: Layout) -> list[tuple]:
+        """Return the (x, y, words, props, positions, length) of each artist of a layout"""
+        if layout._tokens.styles is not None:
+            return ParaMPL._styled_text_specs(layout)
+        return [(x, y, layout.words(idx), layout._props, layout._positions[idx], layout._lengths[idx])
+                for idx, (x, y) in enumerate(zip(layout.x, layout.y))]
+
+    @staticmethod
+    def _styled_text_specs(layout: Layout) -> list[tuple]:
+        """Return the artists of a layout of styled runs, one for each sequence of pieces of a style in a line"""
+        tokens = layout._tokens
+        style_props = [{k: v for k, v in style.items() if k != 'fontname' or v is not None}
+                       for style in tokens.styles]
+
+        specs = []
+        for idx, (x, y) in enumerate(zip(layout.x, layout.y)):
+            pieces = tokens.line_pieces(layout.paragraph[idx], layout.start[idx], layout.stop[idx])
+            positions = layout._positions[idx]
+            along = np.hypot(*positions.T).tolist() + [layout._lengths[idx]]
+
+            first = 0
+            for last in range(1, len(pieces) + 1):
+                if last < len(pieces) and pieces[last][0] == pieces[first][0]:
+                    continue
+
+                words, offsets = [], []
+                for (_, text, starts_word), position in zip(pieces[first:last], positions[first:last]):
+                    if starts_word or not words:
+                        words.append(text)
+                        offsets.append(position)
+                    else:
+                        words[-1] += text
+                offsets = np.array(offsets)
+                specs.append((x + offsets[0, 0], y + offsets[0, 1], words, style_props[pieces[first][0]],
+                              offsets - offsets[0], along[last] - along[first]))
+                first = last
+
+        return specs
+
+    def _phase(self, name: str):
+        """Return a context timing the phase in self.stats, or doing nothing if stats are off"""
+        if self.stats is None:
+            return nullcontext({})
+        return self.stats.phase(name)
+
+    def _clip(self):
+        """Return the clipping of the axes patch, as Artist.set_clip_path() would set it, to share among artists"""
+        patch = self._axes.patch
+        if isinstance(patch, Rectangle):
+            return TransformedBbox(Bbox.unit(), patch.get_transform())
+        return patch
+
+    @staticmethod
+    def _vertical_offset(lp, va) -> float:
+        """Return the vertical shift that aligns the paragraphs according to va"""
         total_height = lp.total_height()
         delta = lp.y_to_bottom_offset()
 
         if va == 'top':
-            for artist in parampl_artists:
-                artist.set_y(artist.get_position()[1] + delta - total_height)
-
+            return delta - total_height
         elif va == 'bottom':
-            if delta != 0:
-                for artist in parampl_artists:
-                    artist.set_y(artist.get_position()[1] + delta)
-
+            return delta
         elif va == 'center':
-            for artist in parampl_artists:
-                artist.set_y(artist.get_position()[1] + delta - total_height / 2)
-
+            return delta - total_height / 2
         else:
             raise ValueError(f"invalid va '{va}'. Must be 'top', 'bottom', or 'center'")
 
-        return parampl_artists, total_height
-
-    def _get_widths_height(self, props,
-                           words: list[str] = None,
-                           ):
-        text_artist = self._axes.text(0, 0, ' ',
-                                      **props,
-                                      )
-        combined_hash = (props['fontsize'],
-                         props['family'], props['fontname'],
-                         props['weight'], props['style'])
-
-        if combined_hash not in self._widths:
-            text_artist.set_text(' ')
-            widths: dict[str, float] = {' ': self._transformed_artist_extent(text_artist).width,
+    def _get_metrics(self, props,
+                     words: list[str] = None,
+                     ):
+        """Return the widths of words and space, and the line height, in points, together with the font key"""
+        with self._phase('measure') as info:
+            # the font file that the properties resolve to, and the rcParams of math and TeX, as they may change
+            combined_hash = (props['fontsize'],
+                             props['family'], props['fontname'],
+                             props['weight'], props['style'], props['rotation'],
+                             font_file(_font_properties(props))) + rendering_key()
+            metrics = self._metrics
+
+            if combined_hash not in metrics.fonts:
+                # a single temporary artist per font resolves the font properties exactly as ax.text() would,
+                # in a figure of the measuring thread rather than in the axes.
+                figure, renderer = measuring_renderer(self._axes.get_figure().dpi)
+                points = 72 / renderer.dpi
+
+                text_artist = Text(0, 0, ' ', **props)
+                text_artist.set_figure(figure)
+                space = text_artist.get_window_extent(renderer=renderer).width * points
+
+                text_artist.set_text('Lg')
+                height = text_artist.get_window_extent(renderer=renderer).height * points
+
+                with metrics.lock:
+                    metrics.fonts.setdefault(combined_hash, (text_artist.get_fontproperties().copy(),
+                                                             text_artist.get_usetex(),
+                                                             text_artist.get_parse_math(),
+                                                             space, height))
+
+            space, height = metrics.fonts[combined_hash][3:]
+
+            widths: dict[str, float] = {' ': space,
                                         '': 0,
                                         }
 
-            text_artist.set_text('Lg')
-            height = self._transformed_artist_extent(text_artist).height
+            if words is not None:
+                width_key = combined_hash + (self._measure,)
+                with metrics.lock:
+                    cached, missing = metrics.widths.get(width_key, words)
+                info |= {'font': _font_label(props), 'hits': len(cached), 'misses': len(missing)}
+                if missing:
+                    # measured outside the lock, a word measured by two threads at once gets the same width twice
+                    if props['rotation']:
+                        measured = self._rotated_widths(props, missing)
+                    else:
+                        measured = self._measure_widths(combined_hash, missing)
+                    with metrics.lock:
+                        metrics.widths.update(width_key, missing, measured)
+                    cached.update(zip(missing, measured))
+                widths |= cached
+
+            return widths, height, combined_hash
+
+    def _rectangles_in_frame(self, xy, width, max_height, height) -> list[rectangle_specification]:
+        """Return the rectangles to avoid that can affect a frame whose top-left corner is at xy"""
+        index = self._rectangle_index
+        if index is None:
+            index = self._rectangle_index = _rectangle_index(list(self._rectangles))
+
+        bottom = -np.inf if max_height is None else xy[1] - max_height - height
+        return index.query(xy[0], xy[0] + width, bottom, xy[1])
+
+    def _geometry(self) -> tuple[float, float, float]:
+        """Return the data units per point along x and y, and the aspect of the axes, checking its orientation"""
+        ax = self._axes
+        if ax.get_ylim()[1] < ax.get_ylim()[0] or ax.get_xlim()[1] < ax.get_xlim()[0]:
+            raise NotImplementedError("paraMPL.write() is only available for plots with increasing x- and y-axis")
 
-            self._widths[combined_hash] = widths
-            self._heights[combined_hash] = height
+        x_scale, y_scale = self._points_to_data()
+        return x_scale, y_scale, get_aspect(ax)
+
+    def _font_key(self, kwargs) -> tuple:
+        """Return the text properties of a write() with these options, their font file, and the rcParams that
+        change the widths"""
+        props = {k: kwargs.get(k) if kwargs.get(k) is not None else v for k, v in self._text_props.items()}
+        return tuple(props.items()), font_file(_font_properties(props)), rendering_key()
+
+    def _points_to_data(self) -> np.ndarray:
+        """Return the data units per point along x and y, for the current limits and figure size"""
+        pixels = self._axes.get_figure().dpi / 72
+        origin, corner = self._axes.transData.inverted().transform([[0, 0], [pixels, pixels]])
+        return corner - origin
+
+    def _measure_widths(self, combined_hash, words: list[str]) -> np.ndarray:
+        """Measure a batch of words without creating artists, returning widths in points"""
+        figure, renderer = measuring_renderer(self._axes.get_figure().dpi)
+
+        if self._persistent is not None:
+            persistent_key = self._persistent.font_key(self._metrics.fonts[combined_hash][0],
+                                                       renderer.dpi, self._measure)
+            widths = self._persistent.lookup(persistent_key, words)
+
+            missing = np.isnan(widths)
+            if missing.any():
+                missing_words = [word for word, miss in zip(words, missing) if miss]
+                widths[missing] = self._display_widths(combined_hash, missing_words, renderer)
+                self._persistent.add(persistent_key, missing_words, widths[missing])
         else:
-            widths = self._widths[combined_hash]
-
-        if words is not None:
-            for word in words:
-                if word not in widths:
-                    text_artist.set_text(word)
-                    widths[word] = self._transformed_artist_extent(text_artist).width
-
-        text_artist.remove()
-
-        return self._widths[combined_hash], self._heights[combined_hash], combined_hash
-
-    def _transformed_artist_extent(self, artist):
-        extent = artist.get_window_extent(renderer=self._renderer)
-        return extent.transformed(self._transform)
+            widths = self._display_widths(combined_hash, words, renderer)
+
+        return widths * 72 / renderer.dpi
+
+    def _rotated_widths(self, props, words: list[str]) -> np.ndarray:
+        """Measure a batch of rotated words as the horizontal extent of a rotated artist, in points"""
+        figure, renderer = measuring_renderer(self._axes.get_figure().dpi)
+
+        text_artist = Text(0, 0, '', **props)
+        text_artist.set_figure(figure)
+        widths = np.zeros(len(words))
+        for idx, word in enumerate(words):
+            text_artist.set_text(word)
+            widths[idx] = text_artist.get_window_extent(renderer=renderer).width
+
+        return widths * 72 / renderer.dpi
+
+    def _display_widths(self, combined_hash, words: list[str], renderer) -> np.ndarray:
+        """Measure a batch of words in display units"""
+        fontprops, usetex, parse_math = self._metrics.fonts[combined_hash][:3]
+        clean_words = [_preprocess_math(word, usetex, parse_math) for word in words]
+
+        widths = np.zeros(len(words))
+        if self._measure == 'glyphs':
+            glyphs_key = (combined_hash, renderer.dpi)
+            with self._metrics.lock:
+                if glyphs_key not in self._metrics.glyphs:
+                    self._metrics.glyphs[glyphs_key] = GlyphAdvances(fontprops, renderer.dpi)
+                glyphs = self._metrics.glyphs[glyphs_key]
+            widths[:] = glyphs.widths([word if not ismath else '' for word, ismath in clean_words])
+            widths[[ismath is not False for word, ismath in clean_words]] = np.nan
+
+        for idx, (clean_word, ismath) in enumerate(clean_words):
+            if clean_word and (self._measure == 'renderer' or np.isnan(widths[idx])):
+                widths[idx] = renderer.get_text_width_height_descent(clean_word, fontprops,
+                                                                     ismath=ismath)[0]
+
+        return widths
+
+
+def _display_boxes(artist, renderer) -> np.ndarray:
+    """Return the (x0, y0, x1, y1) display boxes covering an artist, one per marker or segment when possible"""
+    if isinstance(artist, Line2D):
+        xy = artist.get_transform().transform(artist.get_xydata())
+        xy = xy[np.isfinite(xy).all(axis=1)]
+        boxes = []
+        if artist.get_linestyle() not in ['None', '', ' '] and len(xy) > 1:
+            half = renderer.points_to_pixels(artist.get_linewidth()) / 2
+            boxes.append(np.column_stack([np.minimum(xy[:-1], xy[1:]) - half, np.maximum(xy[:-1], xy[1:]) + half]))
+        if artist.get_marker() not in [None, 'None', '', ' ']:
+            half = renderer.points_to_pixels(artist.get_markersize()) / 2
+            boxes.append(np.column_stack([xy - half, xy + half]))
+        return np.concatenate(boxes) if boxes else np.zeros((0, 4))
+
+    if isinstance(artist, PathCollection) and len(artist.get_offsets()) and len(artist.get_sizes()):
+        xy = artist.get_offset_transform().transform(artist.get_offsets())
+        half = renderer.points_to_pixels(np.sqrt(np.resize(artist.get_sizes(), len(xy)))) / 2
+        keep = np.isfinite(xy).all(axis=1)
+        return np.column_stack([xy - half[:, None], xy + half[:, None]])[keep]
+
+    bbox = artist.get_tightbbox(renderer)  # includes the tick labels of inset axes
+    if bbox is None or not np.isfinite(bbox.extents).all() or bbox.width <= 0 or bbox.height <= 0:
+        return np.zeros((0, 4))
+    return np.array([bbox.extents])
+
+
+def _font_label(props) -> str:
+    """Return a readable name of the font of these properties, for reports"""
+    name = props['fontname'] if props.get('fontname') is not None else props['family']
+    words = [str(name), f"{props['fontsize']:g}pt"] + [str(props[k]) for k in ['weight', 'style']
+                                                          if props[k] not in ['normal', 400]]
+    if props['rotation']:
+        words.append(f"rotated {props['rotation']:g}")
+    return ' '.join(words)
+
+
+def _font_properties(props) -> FontProperties:
+    """Return the font properties that a Text with these properties resolves, without creating it"""
+    return FontProperties(family=props['fontname'] if props.get('fontname') is not None else props['family'],
+                          style=props['style'], weight=props['weight'], size=props['fontsize'])
+
+
+def _jsonable(obj, digits: int | None = None):
+    """Return obj as it reads back from JSON, with floats rounded to `digits` significant digits if given"""
+    def default(value):
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"{type(value).__name__} cannot be stored in a snapshot")
+
+    obj = json.loads(json.dumps(obj, default=default))
+    if digits is None:
+        return obj
+
+    def rounded(value):
+        if isinstance(value, float):
+            return float(f'{value:.{digits}g}')
+        if isinstance(value, list):
+            return [rounded(item) for item in value]
+        if isinstance(value, dict):
+            return {k: rounded(v) for k, v in value.items()}
+        return value
+
+    return rounded(obj)
+
+
+def _avoid_from_json(specification):
+    """Return an avoid specification read from JSON, with its tuples back"""
+    if not specification:
+        return specification
+    if not isinstance(specification[0], list):  # a single (x_lim, (y1, y2))
+        return specification[0], tuple(specification[1])
+    return [(x_limit, tuple(limits)) for x_limit, limits in specification]
+
+
+def _preprocess_math(word, usetex, parse_math):
+    """Mirror matplotlib.text.Text._preprocess_math() so that words are measured as ax.text() would render them"""
+    if usetex:
+        if word == " ":
+            word = r"\ "
+        return word, "TeX"
+    elif not parse_math:
+        return word, False
+    elif cbook.is_math_text(word):
+        return word, True
+    else:
+        return word.replace(r"\$", "$"), False
@@ -0,0 +1,404 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_agg import RendererAgg, get_hinting_flag
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties, findfont, get_font
+from matplotlib.ft2font import Kerning
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, appends are then not locked
+    fcntl = None
+
+_thread_local = threading.local()
+
+
+def measuring_renderer(dpi: float) -> tuple[Figure, RendererAgg]:
+    """
+    Return an Agg renderer at the given DPI, private to the calling thread, and a figure that is never drawn to
+    hold the Text artists being measured. Measurements then neither touch the axes being written nor share
+    a renderer with other threads.
+    """
+    renderers = _thread_local.__dict__.setdefault('renderers', {})
+    if dpi not in renderers:
+        renderers[dpi] = (Figure(dpi=dpi), RendererAgg(1, 1, dpi))
+    return renderers[dpi]
+
+
+# matplotlib 3.11 shapes text with libraqm, which may apply ligatures and GPOS kerning
+_shaping = matplotlib.__version_info__ >= (3, 11)
+_shaping_size = 64
+_shaped_pairs: dict[str, dict[str, bool]] = {}
+
+_rendering_params = sorted(key for key in matplotlib.rcParams
+                           if key.startswith('mathtext.') or key in ['text.usetex', 'text.parse_math',
+                                                                     'text.latex.preamble'])
+
+
+def rendering_key() -> tuple:
+    """
+    Return the rcParams that change the widths of a text beyond its font file and properties: whether it goes
+    through TeX or mathtext, and how they render.
+    """
+    params = matplotlib.rcParams
+    return tuple(params[key] for key in _rendering_params)
+
+
+def font_file(fontprops: FontProperties) -> tuple[str, int]:
+    """
+    Return the font file and face index that the font properties resolve to, as plain values: the FontPath
+    returned by findfont() in matplotlib >= 3.11 cannot be unpickled, and metric caches are sent to workers.
+    """
+    path = findfont(fontprops)
+    return str(path), getattr(path, 'face_index', 0)
+
+
+class GlyphAdvances:
+    """
+    Per-font table of glyph advances and kerning pairs read from FT2Font, filled as new characters appear.
+    Word widths are then the sum of the advances plus the kerning between consecutive glyphs, without asking
+    the renderer to lay out each word.
+
+    Pairs of characters that the renderer's shaping turns into something else than their advances and kern-table
+    kerning (ligatures such as 'fi' or 'ff' in DejaVu Sans, GPOS kerning in STIX) are found by measuring each new
+    pair once per font file with the renderer. Words holding such a pair return NaN, as do words with characters
+    missing from the primary font, so that they can be measured by the renderer.
+
+    Error bound against the renderer measurement: with matplotlib >= 3.11 and Agg, the widths of the modelled
+    words are within 0.01 em, the rounding of hinted kerning. With matplotlib 3.10, which does no shaping,
+    the renderer reports the ink extent rather than the advance, so widths differ by the side bearings of the
+    first and last glyph (typically below 0.1 em).
+
+    Parameters
+    ----------
+    fontprops
+      font properties, as resolved by a Text artist
+    dpi
+      resolution of the renderer, widths are returned in display units
+    """
+
+    def __init__(self,
+                 fontprops: FontProperties,
+                 dpi: float,
+                 ):
+        self._filename = findfont(fontprops)
+        self._fontprops = fontprops.copy()
+        self._size = fontprops.get_size_in_points()
+        self._dpi = dpi
+        self._flags = get_hinting_flag()
+
+        self._advances: dict[str, tuple[int, int]] = {}
+        self._kerning: dict[tuple[int, int], int] = {}
+
+    def _glyph(self, font, char):
+        if char not in self._advances:
+            index = font.get_char_index(ord(char))
+            advance = font.load_glyph(index, flags=self._flags).horiAdvance if index else 0
+            self._advances[char] = (index, advance)
+        return self._advances[char]
+
+    def _kern(self, font, left, right):
+        if (left, right) not in self._kerning:
+            self._kerning[(left, right)] = font.get_kerning(left, right, Kerning.UNFITTED)
+        return self._kerning[(left, right)]
+
+    def _sum_advances(self, font, word):
+        pen = 0
+        previous = None
+        for char in word:
+            index = font.get_char_index(ord(char))
+            if not index:
+                return np.nan
+            if previous is not None:
+                pen += font.get_kerning(previous, index, Kerning.UNFITTED)
+            pen += font.load_glyph(index, flags=self._flags).horiAdvance
+            previous = index
+        return pen / 64
+
+    def _find_shaped(self, words):
+        shaped = _shaped_pairs.setdefault(self._filename, {})
+        pairs = {word[idx:idx + 2] for word in words for idx in range(len(word) - 1)}.difference(shaped)
+        if not pairs or not _shaping:
+            shaped.update(dict.fromkeys(pairs, False))
+            return
+
+        # ligatures and GPOS kerning do not depend on the size, they are looked for at a size where they show
+        fontprops = self._fontprops.copy()
+        fontprops.set_size(_shaping_size)
+        _, renderer = measuring_renderer(72)
+        font = get_font(self._filename)
+        for pair in pairs:
+            font.set_size(_shaping_size, 72)
+            modelled = self._sum_advances(font, pair)
+            measured = renderer.get_text_width_height_descent(pair, fontprops, ismath=False)[0]
+            # also shaped when modelled is NaN, any word holding the pair then falls back to the renderer
+            shaped[pair] = not abs(measured - modelled) <= 1 / 32
+
+    def widths(self, words: list[str]) -> np.ndarray:
+        """Return the display-units width of each word, NaN if the word cannot be modelled"""
+        self._find_shaped(words)
+        shaped = _shaped_pairs[self._filename]
+
+        # the FT2Font object is per thread and shared with the renderers, which set their own size before each use
+        font = get_font(self._filename)
+        font.set_size(self._size, self._dpi)
+
+        ret = np.zeros(len(words))
+        for idx_word, word in enumerate(words):
+            pen = 0
+            previous = None
+            for idx_char, char in enumerate(word):
+                index, advance = self._glyph(font, char)
+                if not index or (idx_char and shaped[word[idx_char - 1:idx_char + 1]]):
+                    pen = np.nan
+                    break
+                if previous is not None:
+                    pen += self._kern(font, previous, index)
+                pen += advance
+                previous = index
+            ret[idx_word] = pen / 64
+
+        return ret
+
+
+class PersistentWidths:
+    """
+    On-disk store of word widths in display units that can be shared by several processes. Each font key
+    (font file identity, size, weight, style, DPI, math and TeX rcParams) has its own append-only file of
+    (width, word) records. Files are memory-mapped read-only to load the records written since the last
+    lookup, and new words are appended under an exclusive lock, so that concurrent workers only ever add
+    complete records.
+
+    Parameters
+    ----------
+    directory
+      directory holding the cache files, created if it does not exist
+    """
+
+    _record = struct.Struct('<dI')  # width, length of the utf-8 encoded word that follows
+
+    def __init__(self,
+                 directory: str | os.PathLike,
+                 ):
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+        self._tables: dict[str, dict[str, float]] = {}
+        self._offsets: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def font_key(fontprops: FontProperties,
+                 dpi: float,
+                 measure: str,
+                 ) -> str:
+        """Return the file name identifying the font file and the properties that affect widths"""
+        filename = findfont(fontprops)
+        stat = os.stat(filename)
+        identity = (filename, stat.st_size, stat.st_mtime_ns,
+                    fontprops.get_size_in_points(), fontprops.get_weight(), fontprops.get_style(),
+                    dpi, measure, matplotlib.__version__, rendering_key())
+        return hashlib.sha1(repr(identity).encode()).hexdigest() + '.widths'
+
+    def _refresh(self, key):
+        table = self._tables.setdefault(key, {})
+        offset = self._offsets.get(key, 0)
+        path = self._directory / key
+        if not path.exists() or path.stat().st_size <= offset:
+            return table
+
+        with open(path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            while offset + self._record.size <= size:
+                width, length = self._record.unpack_from(mm, offset)
+                end = offset + self._record.size + length
+                if end > size:  # record still being written
+                    break
+                table[mm[offset + self._record.size:end].decode('utf-8')] = width
+                offset = end
+
+        self._offsets[key] = offset
+        return table
+
+    def lookup(self, key: str, words: list[str]) -> np.ndarray:
+        """Return the stored widths of words, NaN for those not yet in the cache"""
+        with self._lock:
+            table = self._refresh(key)
+        return np.array([table.get(word, np.nan) for word in words], dtype=float)
+
+    def add(self, key: str, words: list[str], widths) -> None:
+        """Append the widths of new words to the cache"""
+        records = []
+        for word, width in zip(words, widths):
+            encoded = word.encode('utf-8')
+            records.append(self._record.pack(width, len(encoded)) + encoded)
+
+        with self._lock, open(self._directory / key, 'ab') as fp:
+            if fcntl is not None:
+                fcntl.flock(fp, fcntl.LOCK_EX)
+            try:
+                fp.write(b''.join(records))
+                fp.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+class WidthCache:
+    """
+    In-memory cache of word widths per font key, optionally bounded. Each font keeps its words in
+    least-recently-used order: when a font exceeds `max_words_per_font` its least recently used words are
+    evicted, and when all fonts together exceed `max_words` the least recently used word of the largest font
+    table is evicted. Hits, misses, and evictions are counted and reported by cache_info().
+
+    Parameters
+    ----------
+    max_words_per_font
+      maximum number of words kept for each font, unbounded if None
+    max_words
+      maximum number of words kept for all fonts together, unbounded if None
+    """
+
+    def __init__(self,
+                 max_words_per_font: int | None = None,
+                 max_words: int | None = None,
+                 ):
+        self._max_words_per_font = max_words_per_font
+        self._max_words = max_words
+
+        self._tables: dict[tuple, OrderedDict[str, float]] = {}
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self,
+            font_key: tuple,
+            words: list[str],
+            ) -> tuple[dict[str, float], list[str]]:
+        """Return the cached widths among the words, and the list of unique words that are missing"""
+        table = self._tables.setdefault(font_key, OrderedDict())
+
+        found = {}
+        missing = []
+        for word in dict.fromkeys(words):
+            if word in table:
+                table.move_to_end(word)
+                found[word] = table[word]
+            else:
+                missing.append(word)
+
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        return found, missing
+
+    def update(self,
+               font_key: tuple,
+               words: list[str],
+               widths,
+               ) -> None:
+        """Store the widths of new words, evicting old ones if limits are exceeded"""
+        table = self._tables.setdefault(font_key, OrderedDict())
+        for word, width in zip(words, widths):
+            if word not in table:
+                self._size += 1
+            table[word] = width
+
+        if self._max_words_per_font is not None:
+            while len(table) > self._max_words_per_font:
+                self._evict(table)
+        if self._max_words is not None:
+            while self._size > self._max_words:
+                self._evict(max(self._tables.values(), key=len))
+
+    def _evict(self, table):
+        table.popitem(last=False)
+        self._size -= 1
+        self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all words and reset the counters"""
+        self._tables = {}
+        self._size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def cache_info(self) -> dict[str, int]:
+        """Return hits, misses, evictions, number of cached words and number of fonts"""
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'words': self._size,
+                'fonts': len(self._tables),
+                }
+
+
+class MetricCache:
+    """
+    Font metrics in points: word widths, and for each font its resolved properties, space width, and line
+    height. Being independent of axes and DPI, a single measurement serves every ParaMPL instance, subplot, and
+    figure, and stays valid after zooming or resizing, as ParaMPL converts to data units when laying out.
+    By default all ParaMPL instances share the process-wide `shared_metrics`. ParaMPL holds `lock` while
+    reading or updating the cache, so that it can be shared by threads.
+
+    Parameters
+    ----------
+    max_words_per_font
+      maximum number of word widths kept for each font, unbounded if None
+    max_words
+      maximum number of word widths kept for all fonts together, unbounded if None
+    """
+
+    def __init__(self,
+                 max_words_per_font: int | None = None,
+                 max_words: int | None = None,
+                 ):
+        self.widths = WidthCache(max_words_per_font=max_words_per_font,
+                                 max_words=max_words)
+        # font key -> (font properties, usetex, parse_math, space width, line height)
+        self.fonts: dict[tuple, tuple[FontProperties, bool, bool, float, float]] = {}
+        # (font key, dpi) -> glyph table
+        self.glyphs: dict[tuple, GlyphAdvances] = {}
+        self.lock = threading.RLock()
+
+    def clear(self) -> None:
+        """Remove all metrics and reset the counters"""
+        with self.lock:
+            self.widths.clear()
+            self.fonts = {}
+            self.glyphs = {}
+
+    def cache_info(self) -> dict[str, int]:
+        """Return hits, misses, evictions, number of cached words and number of fonts of the word widths"""
+        with self.lock:
+            return self.widths.cache_info()
+
+    def merge(self, other: "MetricCache") -> None:
+        """Add the fonts and word widths of another cache, such as one measured in another process"""
+        with self.lock, other.lock:
+            for font_key, font in other.fonts.items():
+                self.fonts.setdefault(font_key, font)
+            for width_key, table in other.widths._tables.items():
+                self.widths.update(width_key, list(table.keys()), list(table.values()))
+
+    def __getstate__(self):
+        # glyph tables are rebuilt lazily and the lock is per process
+        state = self.__dict__.copy()
+        del state['lock']
+        return state | {'glyphs': {}}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+
+shared_metrics = MetricCache()
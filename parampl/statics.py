@@ -1,12 +1,16 @@
+import bisect
+import heapq
+import itertools
 import re
 from operator import sub
 
+import numpy as np
+
 vertical_lims = tuple[float, float]
 avoid_single_specification = tuple[float, vertical_lims]
 avoid_specification = avoid_single_specification | list[avoid_single_specification]
 
-border_single_specification = tuple[float, float, float]
-border_specification = border_single_specification | list[border_single_specification]
+allow_single_specification = tuple[float, float, float, float]  # x_left, x_right, y_top, y_bottom
 
 
 def split_into_paragraphs(text, collapse_whites=True, paragraph_per_line=False):
@@ -32,6 +36,79 @@ def split_into_paragraphs(text, collapse_whites=True, paragraph_per_line=False):
     return ret, split_paragraph
 
 
+def iter_paragraphs(chunks, collapse_whites=True, paragraph_per_line=False):
+    """Yield the paragraphs of a text read in chunks, split as split_into_paragraphs() splits the whole text.
+
+A paragraph is yielded as soon as the separator after it is followed by more text, so that reading can stop early.
+"""
+    n_newlines = 1 if paragraph_per_line else 2
+    if collapse_whites:
+        whites = ' \t\n'
+        complete = re.compile(f'(?:[ \t]*\n){{{n_newlines},}}[ \t]*(?=[^ \t\n])')
+    else:
+        whites = '\n'
+        complete = re.compile(f'\n{{{n_newlines},}}(?=[^\n])')
+
+    # a separator is made of whites only, hence one completed by a new chunk starts within the whites that ended the
+    # text before it: only those are searched again, and the rest of the pending text is kept in a list of pieces
+    pieces = []
+    tail = ''
+    for chunk in chunks:
+        text = tail + chunk
+        last = None
+        for last in complete.finditer(text):
+            pass
+        if last is not None:
+            # the text up to the separator splits as the whole text would, plus an empty paragraph at its end
+            pieces.append(text[:last.end()])
+            yield from split_into_paragraphs(''.join(pieces), collapse_whites=collapse_whites,
+                                             paragraph_per_line=paragraph_per_line)[0][:-1]
+            pieces = []
+            text = text[last.end():]
+
+        body = text.rstrip(whites)
+        if body:
+            pieces.append(body)
+        tail = text[len(body):]
+
+    yield from split_into_paragraphs(''.join(pieces) + tail, collapse_whites=collapse_whites,
+                                     paragraph_per_line=paragraph_per_line)[0]
+
+
+def split_runs_into_paragraphs(runs, collapse_whites=True, paragraph_per_line=False):
+    """Split styled runs of text as split_into_paragraphs() splits their concatenated text.
+
+`runs` is a list of (text, style). Returns the paragraphs, each a list of words, each word a list of (style, text)
+pieces where the style changes within the word, and the paragraph separator.
+"""
+    text = ''.join(run_text for run_text, _ in runs)
+    owner = [style for run_text, style in runs for _ in run_text]
+
+    paragraphs, split_paragraph = split_into_paragraphs(text,
+                                                        collapse_whites=collapse_whites,
+                                                        paragraph_per_line=paragraph_per_line)
+    ret = []
+    position = 0
+    for paragraph in paragraphs:
+        words = []
+        for word in paragraph.split(' '):
+            # words keep their characters, and only whites are found between consecutive words
+            start = text.find(word, position)
+            position = start + len(word)
+            if not word:
+                words.append([(owner[min(start, len(owner) - 1)] if owner else runs[0][1], '')])
+                continue
+
+            pieces = []
+            for style, indices in itertools.groupby(range(start, position), key=owner.__getitem__):
+                indices = list(indices)
+                pieces.append((style, text[indices[0]:indices[-1] + 1]))
+            words.append(pieces)
+        ret.append(words)
+
+    return ret, split_paragraph
+
+
 def get_aspect(ax):
     # code from https://stackoverflow.com/questions/41597177/get-aspect-ratio-of-axes
     #
@@ -48,142 +125,158 @@ def get_aspect(ax):
     return disp_ratio / data_ratio
 
 
-def mix_borders(limit, x0, w0, left1, right1):
-    right = x0 + w0
-    left = max(left1, x0)
-    ww = min(right, right1) - left
-    return limit, left, ww
-
-
-def finish_with_top(x, w,
-                    x_left, x_right,
-                    y_top, y_bottom):
-
-    return [(y_top, x, w),
-            mix_borders(y_bottom, x, w, x_left, x_right),
-            (None, x, w),
-            ]
-
-
-def finish_with_bottom(x, w,
-                       x_left, x_right,
-                       y_bottom):
-
-    return [mix_borders(y_bottom, x, w, x_left, x_right),
-            (None, x, w)]
-
-
-def parse_avoid(original_borders,
+def parse_avoid(x: float, width: float,
                 avoid_left_of: avoid_specification,
                 avoid_right_of: avoid_specification,
-                height) -> list[border_single_specification]:
+                height) -> list[allow_single_specification]:
+    """Translate avoid specifications into the rectangles where a line starting at height y can be written.
 
+Each one is (x_left, x_right, y_top, y_bottom), and applies to lines with y_bottom <= y < y_top. The bottom is
+lowered by the line `height`, since a line at y spans up to y + height.
+"""
     if avoid_left_of is None:
-        avoid_left_of = (None, (None, None))
+        avoid_left_of = []
     if avoid_right_of is None:
-        avoid_right_of = (None, (None, None))
+        avoid_right_of = []
 
     if not isinstance(avoid_right_of, list):
         avoid_right_of = [avoid_right_of]
     if not isinstance(avoid_left_of, list):
         avoid_left_of = [avoid_left_of]
 
-    _, xx, width = original_borders[0]
-
-    # allows is a list of allowable rectangles to write. However, only the intersection of them is permitted.
     allows = []
-    for x, (y1, y2) in avoid_left_of:
-        if x is not None:
-            if y2 < y1:
-                y1, y2 = y2, y1
-            allows.append((x, xx + width, y1 - height, y2))
-    for x, (y1, y2) in avoid_right_of:
-        if x is not None:
-            if y2 < y1:
-                y1, y2 = y2, y1
-            allows.append((xx, x, y1 - height, y2))
-
-    borders = original_borders
+    for x_limit, (y1, y2) in avoid_left_of:
+        if x_limit is not None:
+            allows.append((x_limit, x + width, max(y1, y2), min(y1, y2) - height))
+    for x_limit, (y1, y2) in avoid_right_of:
+        if x_limit is not None:
+            allows.append((x, x_limit, max(y1, y2), min(y1, y2) - height))
 
-    # here it creates the final border by processing one by one each of the allowed rectangles and
-    # computing the intersection
-    for x_left, x_right, y_top, y_bottom in allows:
-        if y_top < y_bottom:
-            y_top, y_bottom = y_bottom, y_top
+    return allows
 
-        borders = allow_to_borders(borders, x_left, x_right, y_top, y_bottom)
 
-    return borders
+def merge_allows(x: float, width: float,
+                 allows: list[allow_single_specification],
+                 ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Merge allowed rectangles into borders: horizontal slabs sorted from top to bottom.
 
+Returns the arrays (limits, x_lefts, widths). Slab `i` applies to heights `limits[i] <= y < limits[i - 1]`, the last
+limit being -inf, and a line there can be written from `x_lefts[i]` along `widths[i]`, the intersection of the frame
+and of the allowed rectangles covering the slab. Slabs with no width are fully blocked.
 
-def allow_to_borders(incoming_borders, x_left, x_right, y_top, y_bottom
-                     ) -> list[border_single_specification]:
-    """translates user-friendly `avoid` areas to code-friendly `borders` with the allowed areas.
+A single sweep from the top keeps the active rectangles in heaps of their left and right limits, so that merging
+`n` rectangles takes O(n log n).
+"""
+    by_top = sorted(range(len(allows)), key=lambda idx: -allows[idx][2])
+    by_bottom = sorted(range(len(allows)), key=lambda idx: -allows[idx][3])
+    edges = sorted({edge for _, _, y_top, y_bottom in allows for edge in (y_top, y_bottom)}, reverse=True)
+
+    lefts = [(-x, -1)]
+    rights = [(x + width, -1)]
+    ended = set()
+    limits, x_lefts, widths = [], [], []
+    span = (x, width)
+    next_top = next_bottom = 0
+    for edge in edges + [-np.inf]:
+        # the slab above this edge ends here, merged with the previous one if they have the same span
+        if x_lefts and (x_lefts[-1], widths[-1]) == span:
+            limits[-1] = edge
+        else:
+            limits.append(edge)
+            x_lefts.append(span[0])
+            widths.append(span[1])
+
+        while next_top < len(by_top) and allows[by_top[next_top]][2] >= edge:
+            idx = by_top[next_top]
+            heapq.heappush(lefts, (-allows[idx][0], idx))
+            heapq.heappush(rights, (allows[idx][1], idx))
+            next_top += 1
+        while next_bottom < len(by_bottom) and allows[by_bottom[next_bottom]][3] >= edge:
+            ended.add(by_bottom[next_bottom])
+            next_bottom += 1
+        while lefts[0][1] in ended:
+            heapq.heappop(lefts)
+        while rights[0][1] in ended:
+            heapq.heappop(rights)
+
+        left = -lefts[0][0]
+        span = (left, rights[0][0] - left)
+
+    return np.array(limits, dtype=float), np.array(x_lefts, dtype=float), np.array(widths, dtype=float)
+
+
+def cumulative_widths(widths: np.ndarray, space_width: float) -> tuple[np.ndarray, np.ndarray]:
+    """Return the length of a line from the first word to the start, and to the end, of each word.
+
+`starts` has one more element than `widths`, the length up to the (virtual) word after the last one. The length of
+a line from word `i` up to the end of word `j` is then `ends[j] - starts[i]`.
+"""
+    starts = np.zeros(len(widths) + 1)
+    np.cumsum(widths + space_width, out=starts[1:])
+    return starts, starts[:-1] + widths
 
-Avoid specifies a list of rectangles that can be written into. However, it is only
-the intersection of them the real allowed place.
 
-border specification is a vertical-sorted list of (limit, x_left, width). parampl will continue
-writing text from position `x_left` and width `width` until it reached `limit` then it will get
-the new border.
+def line_break(starts: np.ndarray, ends: np.ndarray, first: int, width: float) -> int:
+    """Return the index after the last word that fits in a line of `width` starting at word `first`.
 
+A line always takes at least one word, even if it is wider than `width`.
 """
+    return max(first + 1, int(np.searchsorted(ends, starts[first] + width, side='right')))
 
-    old_borders = incoming_borders.copy()
-    borders = []
-
-    # process the blocks on top of the new avoid
-    l, x, w = old_borders.pop(0)
-    if l is None:
-        return borders + finish_with_top(x, w, x_left, x_right, y_top, y_bottom)
-
-    while l > y_top:
-        borders.append((l, x, w))
-        l, x, w = old_borders.pop(0)
-        if l is None:
-            return borders + finish_with_top(x, w, x_left, x_right, y_top, y_bottom)
-
-    # if the new avoid starts at the same place as an old, then mix and get the next avoid, otherwise place the new
-    if l == y_top:
-        borders.append((l, x, w))
-        l, x, w = old_borders.pop(0)
-        if l is None:
-            return borders + finish_with_bottom(x, w, x_left, x_right, y_bottom)
-    else:
-        borders.append((y_top, x, w))
-
-    if l > y_bottom:  # if the new finishes after layer keep looping
-        borders.append(mix_borders(l, x, w, x_left, x_right))
-
-        l, x, w = old_borders.pop(0)
-        if l is None:
-            return borders + finish_with_bottom(x, w, x_left, x_right, y_bottom)
-
-        while l > y_bottom:
-            borders.append(mix_borders(l, x, w, x_left, x_right))
-            l, x, w = old_borders.pop(0)
-            if l is None:
-                return borders + finish_with_bottom(x, w, x_left, x_right, y_bottom)
-        if l == y_bottom:
-            borders.append(mix_borders(l, x, w, x_left, x_right))
-            l, x, w = old_borders.pop(0)
-            if l is None:
-                return borders + [(l, x, w)]
-        else:
-            borders.append(mix_borders(y_bottom, x, w, x_left, x_right))
-        borders.append((l, x, w))
-        l, x, w = old_borders.pop(0)
-
-    elif l == y_bottom:  # if the new matches the layer then mix and get the next layer
-        borders.append(mix_borders(l, x, w, x_left, x_right))
-        l, x, w = old_borders.pop(0)
 
-    else:  # if the new is above, then add it and continue
-        borders.append((mix_borders(y_bottom, x, w, x_left, x_right)))
+def optimal_breaks(starts: np.ndarray, ends: np.ndarray, line_width, tolerance: float = 0.3) -> list[int]:
+    """Return the index after the last word of each line, minimizing the raggedness of the whole paragraph.
 
-    # keep adding all layers below current
-    while l is not None:
-        borders.append((l, x, w))
-        l, x, w = old_borders.pop(0)
+Dynamic programming over break points, in the spirit of Knuth-Plass: among the breaks with the fewest lines, those
+with the lowest sum of the squared relative slack of each line, the paragraph's last line excepted. Only lines whose
+relative slack is within `tolerance` are considered, besides the longest line that fits (the greedy choice), so
+that each word has a bounded number of candidate breaks and the cost stays linear in the paragraph length. As the
+greedy choice is always a candidate, there are never more lines than with greedy breaks.
 
-    return borders + [(l, x, w)]
+`line_width(n)` must return the width available for the n-th line of the paragraph, which allows for borders.
+"""
+    n_words = len(ends)
+    starts = starts.tolist()
+    ends = ends.tolist()
+    widths = {}
+
+    cost = [float('inf')] * (n_words + 1)
+    lines = [n_words + 1] * (n_words + 1)
+    previous = [0] * (n_words + 1)
+    cost[0] = 0.0
+    lines[0] = 0
+
+    for first in range(n_words):
+        if cost[first] == float('inf'):
+            continue
+
+        n_line = lines[first]
+        if n_line not in widths:
+            widths[n_line] = line_width(n_line)
+        width = widths[n_line]
+
+        longest = max(first + 1, bisect.bisect_right(ends, starts[first] + width))
+        for last in range(longest, first, -1):
+            slack = width - (ends[last - 1] - starts[first])
+            if slack < 0:  # a single word wider than the line
+                demerits = 1e6
+            elif last == n_words:
+                demerits = 0.0
+            else:
+                demerits = (slack / width) ** 2
+            if last < longest and slack > tolerance * width:
+                break
+
+            total = cost[first] + demerits
+            if n_line + 1 < lines[last] or (n_line + 1 == lines[last] and total < cost[last]):
+                cost[last] = total
+                lines[last] = n_line + 1
+                previous[last] = first
+
+    breaks = []
+    last = n_words
+    while last > 0:
+        breaks.append(last)
+        last = previous[last]
+
+    return breaks[::-1]
@@ -0,0 +1,83 @@
+import threading
+import time
+from contextlib import contextmanager
+
+__all__ = ['PhaseStats']
+
+
+class PhaseStats:
+    """
+    Opt-in timing of the phases of ParaMPL's layout, accumulated over calls: 'split' (text into paragraphs and
+    words), 'measure' (word widths and font metrics, with the cache hits and misses of each font), 'borders'
+    (avoid regions and rectangles of a frame), 'breaks' (line breaking), 'align' (vertical alignment), and
+    'artists' (creation of the Text artists). Times are wall-clock, in seconds. Drawing happens later in
+    matplotlib, hence a slow savefig() with fast phases points at the drawing.
+
+    A phase running inside another one, such as 'split' and 'measure' while 'breaks' reads and measures the
+    paragraphs of write_stream(), only counts in its own time, so that the times of all phases add up.
+
+    Parameters
+    ----------
+    callback
+      called after each phase with its name, its duration, and a dictionary of details (such as 'font', 'hits',
+      and 'misses' for 'measure'), e.g. to forward them to a metrics system
+    """
+
+    def __init__(self,
+                 callback=None,
+                 ):
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._nested = threading.local()
+
+        self.phases: dict[str, dict[str, float]] = {}
+        self.fonts: dict[str, dict[str, int]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed code as the phase `name`, yielding a dictionary where details can be stored"""
+        info = {}
+        # time spent in the phases running inside each open phase of this thread
+        inner = self._nested.__dict__.setdefault('inner', [])
+        inner.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            total = time.perf_counter() - start
+            elapsed = total - inner.pop()
+            if inner:
+                inner[-1] += total
+            with self._lock:
+                phase = self.phases.setdefault(name, {'calls': 0, 'time': 0.0})
+                phase['calls'] += 1
+                phase['time'] += elapsed
+                if 'font' in info:
+                    font = self.fonts.setdefault(info['font'], {'hits': 0, 'misses': 0})
+                    font['hits'] += info.get('hits', 0)
+                    font['misses'] += info.get('misses', 0)
+
+            if self.callback is not None:
+                self.callback(name, elapsed, info)
+
+    def reset(self) -> None:
+        """Forget the accumulated times and counts"""
+        with self._lock:
+            self.phases = {}
+            self.fonts = {}
+
+    def report(self) -> dict:
+        """Return a copy of the accumulated times and counts, per phase and per font"""
+        with self._lock:
+            return {'phases': {name: dict(phase) for name, phase in self.phases.items()},
+                    'fonts': {font: dict(counts) for font, counts in self.fonts.items()},
+                    }
+
+    def __str__(self):
+        report = self.report()
+        lines = [f"{'phase':10s} {'calls':>8s} {'time [ms]':>12s}"]
+        lines += [f"{name:10s} {phase['calls']:8d} {phase['time'] * 1e3:12.3f}"
+                  for name, phase in report['phases'].items()]
+        lines += [f"font {font}: {counts['hits']} hits, {counts['misses']} misses"
+                  for font, counts in report['fonts'].items()]
+        return '\n'.join(lines)
@@ -0,0 +1,45 @@
+import matplotlib
+import numpy as np
+import pytest
+
+matplotlib.use('Agg')
+
+from matplotlib.figure import Figure  # noqa: E402
+
+TEXT = """Lorem ipsum dolor sit amet, consectetur adipiscing elit. Cras elementum pellentesque interdum. Sed erat
+augue, cursus at ante nec, pretium feugiat metus. Aliquam laoreet nunc leo, eget porta quam molestie eu.
+
+Proin metus nisl, accumsan eu efficitur in, bibendum nec ex. Curabitur facilisis, enim ut venenatis ultrices, mi
+lorem vestibulum sem, vel sagittis lacus mauris ut ligula. Proin efficitur iaculis dolor imperdiet vehicula.
+
+Donec pellentesque, tortor non pretium pretium, diam tortor malesuada magna, et auctor nisi eros vitae lectus."""
+
+
+def _new_axes():
+    ax = Figure().add_subplot()
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    return ax
+
+
+def _artists_state(artists):
+    return sorted((type(artist).__name__, artist.get_text(), tuple(np.round(artist.get_position(), 12)),
+                   artist.get_fontsize(), artist.get_fontweight()) for artist in artists)
+
+
+@pytest.fixture
+def text():
+    """Three paragraphs of placeholder text."""
+    return TEXT
+
+
+@pytest.fixture
+def axes():
+    """Factory of fresh axes spanning 0..1 in both directions."""
+    return _new_axes
+
+
+@pytest.fixture
+def state():
+    """Sortable description of text artists, to compare two layouts."""
+    return _artists_state
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from parampl import ParaMPL
+
+
+def _visible(animated):
+    return [artist for artist in animated.artists if artist.get_visible()]
+
+
+def _typed(animated):
+    lines = sorted(_visible(animated), key=lambda artist: -artist.get_position()[1])
+    return ''.join(artist.get_text() for artist in lines)
+
+
+@pytest.mark.parametrize('justify', ['left', 'full'])
+def test_frame_types_the_first_characters(text, axes, justify):
+    animated = ParaMPL(axes(), width=0.8, fontsize=8).animate(text, (0.1, 0.9), justify=justify)
+    typed = ''.join(animated.layout.text(idx) for idx in range(len(animated.layout)))
+    assert animated.n_chars == len(typed)
+
+    animated.init()
+    assert not _visible(animated)
+    for n_chars in [0, 1, 5, 70, 71, 200, 333, animated.n_chars - 1, animated.n_chars]:
+        animated.frame(n_chars)
+        # a justified line being typed does not show the space after its last word
+        assert _typed(animated).rstrip() == typed[:n_chars].rstrip()
+
+
+@pytest.mark.parametrize('justify', ['left', 'full'])
+def test_last_frame_matches_write(text, axes, state, justify):
+    animated = ParaMPL(axes(), width=0.8, fontsize=8).animate(text, (0.1, 0.9), justify=justify)
+    written = ParaMPL(axes(), width=0.8, fontsize=8).write(text, (0.1, 0.9), justify=justify)
+
+    animated.frame(animated.n_chars // 2)
+    assert state(_visible(animated)) != state(written.artists)
+    animated.frame()
+    assert state(_visible(animated)) == state(written.artists)
+
+
+def test_scrolling_hides_the_lines_out_of_view(text, axes, state):
+    ax = axes()
+    animated = ParaMPL(ax, width=0.8, fontsize=8).animate('\n\n'.join([text] * 4), (0.1, 0.9), justify='full')
+    layout = animated.layout
+    bottom, top = ax.get_ylim()
+    pitch = -np.median(np.diff(layout.y))
+
+    animated.frame()
+    first = state(_visible(animated))
+    for dy in [0.5, 1.0, 1.7, 0]:
+        animated.frame(dy=dy)
+        shown = sorted(artist.get_position()[1] - dy for artist in _visible(animated))
+        in_view = sorted(y for y in layout.y if bottom - pitch <= y + dy <= top + pitch)
+        assert shown == pytest.approx(in_view)
+        assert len(shown) < len(layout)
+
+    # the pool's artists are reused for other lines while scrolling, and show the first ones again
+    assert state(_visible(animated)) == first
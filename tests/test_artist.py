@@ -0,0 +1,48 @@
+import pickle
+
+import matplotlib
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from parampl import ParaMPL
+
+
+def _draw(ax):
+    FigureCanvasAgg(ax.figure).draw()
+
+
+def test_paragraph_keeps_its_layout_while_panning(text, axes):
+    ax = axes()
+    paragraph = ParaMPL(ax, width=0.8, fontsize=8).add_paragraph(text, (0.1, 0.9))
+    _draw(ax)
+    texts = paragraph.get_texts()
+
+    ax.set_xlim(0.5, 1.5)
+    ax.set_ylim(0.5, 1.5)
+    _draw(ax)
+    assert paragraph.get_texts() is texts
+
+
+@pytest.mark.parametrize('params', [{'font.sans-serif': ['DejaVu Serif']}, {'mathtext.fontset': 'stix'}])
+def test_paragraph_is_laid_out_again_for_new_fonts(text, axes, params):
+    ax = axes()
+    paragraph = ParaMPL(ax, width=0.8, fontsize=8).add_paragraph(text + r' $\sum_i x_i^2$', (0.1, 0.9))
+    _draw(ax)
+    texts = paragraph.get_texts()
+
+    with matplotlib.rc_context(params):
+        _draw(ax)
+        assert paragraph.get_texts() is not texts
+        reference = ParaMPL(axes(), width=0.8, fontsize=8).layout(text + r' $\sum_i x_i^2$', (0.1, 0.9))
+        assert [text.get_position() for text in paragraph.get_texts()] == list(zip(reference.x, reference.y))
+
+
+def test_drawn_paragraph_pickles(text, axes):
+    ax = axes()
+    paragraph = ParaMPL(ax, width=0.8, fontsize=8).add_paragraph(text, (0.1, 0.9))
+    _draw(ax)
+
+    figure = pickle.loads(pickle.dumps(ax.figure))
+    _draw(figure.axes[0])
+    copy, = [artist for artist in figure.axes[0].get_children() if isinstance(artist, type(paragraph))]
+    assert copy.total_height == paragraph.total_height
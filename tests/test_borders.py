@@ -0,0 +1,156 @@
+import random
+
+import numpy as np
+import pytest
+
+from parampl.core import _line_position
+from parampl.statics import merge_allows, parse_avoid
+
+
+# Reference: the borders as they were built before merge_allows(), one avoid region at a time.
+# A border is (limit, x_left, width), applying while y >= limit, the last one having limit None.
+
+def _mix_borders(limit, x0, w0, left1, right1):
+    left = max(left1, x0)
+    return limit, left, min(x0 + w0, right1) - left
+
+
+def _finish_with_top(x, w, x_left, x_right, y_top, y_bottom):
+    return [(y_top, x, w), _mix_borders(y_bottom, x, w, x_left, x_right), (None, x, w)]
+
+
+def _finish_with_bottom(x, w, x_left, x_right, y_bottom):
+    return [_mix_borders(y_bottom, x, w, x_left, x_right), (None, x, w)]
+
+
+def _allow_to_borders(incoming_borders, x_left, x_right, y_top, y_bottom):
+    old_borders = incoming_borders.copy()
+    borders = []
+
+    limit, x, w = old_borders.pop(0)
+    if limit is None:
+        return borders + _finish_with_top(x, w, x_left, x_right, y_top, y_bottom)
+
+    while limit > y_top:
+        borders.append((limit, x, w))
+        limit, x, w = old_borders.pop(0)
+        if limit is None:
+            return borders + _finish_with_top(x, w, x_left, x_right, y_top, y_bottom)
+
+    if limit == y_top:
+        borders.append((limit, x, w))
+        limit, x, w = old_borders.pop(0)
+        if limit is None:
+            return borders + _finish_with_bottom(x, w, x_left, x_right, y_bottom)
+    else:
+        borders.append((y_top, x, w))
+
+    if limit > y_bottom:
+        borders.append(_mix_borders(limit, x, w, x_left, x_right))
+
+        limit, x, w = old_borders.pop(0)
+        if limit is None:
+            return borders + _finish_with_bottom(x, w, x_left, x_right, y_bottom)
+
+        while limit > y_bottom:
+            borders.append(_mix_borders(limit, x, w, x_left, x_right))
+            limit, x, w = old_borders.pop(0)
+            if limit is None:
+                return borders + _finish_with_bottom(x, w, x_left, x_right, y_bottom)
+        if limit == y_bottom:
+            borders.append(_mix_borders(limit, x, w, x_left, x_right))
+            limit, x, w = old_borders.pop(0)
+            if limit is None:
+                return borders + [(limit, x, w)]
+        else:
+            borders.append(_mix_borders(y_bottom, x, w, x_left, x_right))
+        borders.append((limit, x, w))
+        limit, x, w = old_borders.pop(0)
+
+    elif limit == y_bottom:
+        borders.append(_mix_borders(limit, x, w, x_left, x_right))
+        limit, x, w = old_borders.pop(0)
+
+    else:
+        borders.append(_mix_borders(y_bottom, x, w, x_left, x_right))
+
+    while limit is not None:
+        borders.append((limit, x, w))
+        limit, x, w = old_borders.pop(0)
+
+    return borders + [(limit, x, w)]
+
+
+def _reference_borders(x, width, allows):
+    borders = [(None, x, width)]
+    for x_left, x_right, y_top, y_bottom in allows:
+        borders = _allow_to_borders(borders, x_left, x_right, y_top, y_bottom)
+    return borders
+
+
+def _reference_at(borders, y):
+    for limit, x, width in borders:
+        if limit is None or y >= limit:
+            return x, width
+
+
+def _random_avoids(rng, n, grid=False):
+    def height():
+        return rng.randint(-10, 10) / 10 if grid else rng.uniform(-1, 1)
+
+    avoid_left_of, avoid_right_of = [], []
+    for idx in range(n):
+        region = (height(), height())
+        if idx % 2:
+            avoid_left_of.append((rng.uniform(0, 0.5), region))
+        else:
+            avoid_right_of.append((rng.uniform(0.5, 1), region))
+    return avoid_left_of, avoid_right_of
+
+
+@pytest.mark.parametrize('grid', [False, True])
+@pytest.mark.parametrize('n_avoids', [1, 2, 5, 20, 100])
+def test_merge_allows_matches_reference(n_avoids, grid):
+    rng = random.Random(n_avoids)
+    for _ in range(20):
+        x, width, height = 0.1, 0.8, 0.02
+        allows = parse_avoid(x, width, *_random_avoids(rng, n_avoids, grid=grid), height)
+        reference = _reference_borders(x, width, allows)
+        limits, x_lefts, widths = merge_allows(x, width, allows)
+
+        edges = [edge for _, _, y_top, y_bottom in allows for edge in (y_top, y_bottom)]
+        for y in edges + [rng.uniform(-1.2, 1.2) for _ in range(200)]:
+            border = int(np.searchsorted(-limits, -y, side='left'))
+            assert (x_lefts[border], widths[border]) == pytest.approx(_reference_at(reference, y))
+
+
+def _line_heights(lp, bottom):
+    heights = []
+    while lp.y > bottom:
+        heights.append(lp.y)
+        lp.next_line()
+    return heights
+
+
+def test_line_position_follows_reference():
+    rng = random.Random(0)
+    avoid_left_of, avoid_right_of = _random_avoids(rng, 30)
+    lp = _line_position((0.1, 1), 0.8, 0.02, 0, 1.2, 'left', 'left')
+    lp.add_avoids(avoid_left_of, avoid_right_of, initialize=True)
+    reference = _reference_borders(0.1, 0.8, parse_avoid(0.1, 0.8, avoid_left_of, avoid_right_of, 0.02))
+
+    while lp.y > -1.2:
+        if lp.width_line > 0:
+            assert (lp.x, lp.width_line) == pytest.approx(_reference_at(reference, lp.y))
+        lp.next_line()
+
+
+def test_full_width_rectangle_is_skipped():
+    height = 0.02
+    lp = _line_position((0.1, 1), 0.8, height, 0, 1.2, 'left', 'left')
+    lp.add_rectangles([(0, 1, 0.5, 0.6)])
+    lp.add_avoids(None, None, initialize=True)
+
+    heights = np.array(_line_heights(lp, 0))
+    assert not ((heights >= 0.5 - height) & (heights < 0.6)).any()
+    assert (heights >= 0.6).any() and (heights < 0.5 - height).any()
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+import pytest
+
+from parampl.statics import cumulative_widths, line_break, optimal_breaks
+
+
+def _greedy_breaks(starts, ends, line_width):
+    breaks = []
+    while not breaks or breaks[-1] < len(ends):
+        breaks.append(line_break(starts, ends, breaks[-1] if breaks else 0, line_width(len(breaks))))
+    return breaks
+
+
+def _lines(breaks):
+    return list(zip([0] + breaks[:-1], breaks))
+
+
+def _squared_slack(starts, ends, breaks, line_width):
+    return sum(((line_width(n_line) - (ends[last - 1] - starts[first])) / line_width(n_line)) ** 2
+               for n_line, (first, last) in enumerate(_lines(breaks)[:-1]))
+
+
+@pytest.mark.parametrize('borders', [False, True])
+def test_optimal_never_takes_more_lines_than_greedy(borders):
+    rng = random.Random(0)
+    for _ in range(500):
+        widths = np.array([rng.uniform(1, rng.choice([5, 10, 30])) for _ in range(rng.randint(1, 80))])
+        line_widths = [rng.uniform(10, 50)] * 200 if not borders else [rng.uniform(10, 50) for _ in range(200)]
+        starts, ends = cumulative_widths(widths, 1.0)
+
+        breaks = optimal_breaks(starts, ends, line_widths.__getitem__)
+        assert breaks[-1] == len(widths)
+        assert len(breaks) <= len(_greedy_breaks(starts, ends, line_widths.__getitem__))
+        for n_line, (first, last) in enumerate(_lines(breaks)):
+            # through line_width(n), each line fits in the width of its own line
+            assert last - first == 1 or ends[last - 1] - starts[first] <= line_widths[n_line]
+
+
+def test_optimal_lowers_the_squared_slack():
+    starts, ends = cumulative_widths(np.array([8., 1., 5., 5.]), 1.0)
+    line_width = lambda n_line: 10.0  # noqa: E731
+
+    greedy = _greedy_breaks(starts, ends, line_width)
+    optimal = optimal_breaks(starts, ends, line_width)
+    assert greedy == [2, 3, 4]  # '8 1' leaves the second line half empty
+    assert optimal == [1, 3, 4]
+    assert _squared_slack(starts, ends, optimal, line_width) < _squared_slack(starts, ends, greedy, line_width)
+
+
+def test_optimal_follows_the_width_of_each_line():
+    starts, ends = cumulative_widths(np.full(6, 2.0), 1.0)
+    line_widths = [2., 5., 8.]
+
+    assert optimal_breaks(starts, ends, line_widths.__getitem__) == [1, 3, 6]
+
+
+def test_word_wider_than_the_line_stands_alone():
+    starts, ends = cumulative_widths(np.array([3., 20., 3., 3.]), 1.0)
+
+    assert optimal_breaks(starts, ends, lambda n_line: 10.0) == [1, 2, 4]
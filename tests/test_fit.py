@@ -0,0 +1,35 @@
+import pytest
+
+from parampl import ParaMPL
+
+
+def _fits(para, text, fontsize, max_height):
+    written = para.write(text, (0.1, 0.9), fontsize=fontsize, max_height=max_height)
+    return not written.leftover and written.total_height <= max_height
+
+
+def test_text_that_fits_keeps_its_fontsize(text, axes):
+    para = ParaMPL(axes(), width=0.8, fontsize=8)
+
+    assert para.fit_fontsize(text, (0.1, 0.9), max_height=0.8) == 8
+    artists, _ = para.write(text, (0.1, 0.9), max_height=0.8, fit='shrink')
+    assert {artist.get_fontsize() for artist in artists} == {8}
+
+
+def test_text_shrinks_to_fit(text, axes):
+    para = ParaMPL(axes(), width=0.8, fontsize=14)
+    fontsize = para.fit_fontsize(text, (0.1, 0.9), max_height=0.3)
+
+    assert 1 <= fontsize < 14
+    assert _fits(ParaMPL(axes(), width=0.8), text, fontsize, 0.3)
+    assert not _fits(ParaMPL(axes(), width=0.8), text, round(fontsize + 0.1, 1), 0.3)
+
+    artists, _ = para.write(text, (0.1, 0.9), max_height=0.3, fit='shrink')
+    assert {artist.get_fontsize() for artist in artists} == {fontsize}
+
+
+@pytest.mark.parametrize('min_fontsize', [10, 14, 20])
+def test_min_fontsize_never_grows_the_text(text, axes, min_fontsize):
+    para = ParaMPL(axes(), width=0.8, fontsize=14)
+
+    assert para.fit_fontsize(text, (0.1, 0.9), max_height=0.05, min_fontsize=min_fontsize) == min(min_fontsize, 14)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from matplotlib.font_manager import FontProperties
+
+from parampl import ParaMPL
+from parampl.metrics import GlyphAdvances, measuring_renderer
+
+LIGATURES = ['office', 'efficitur', 'waffle', 'fluffy', 'afflict', 'shuffled', 'AVATAR', 'Typography', 'fjord']
+
+
+@pytest.mark.parametrize('family', ['DejaVu Sans', 'DejaVu Serif', 'STIXGeneral'])
+@pytest.mark.parametrize('weight', ['normal', 'bold'])
+@pytest.mark.parametrize('size, dpi', [(6, 72), (10, 100), (30, 100), (12, 300)])
+def test_glyph_widths_within_bound(text, family, weight, size, dpi):
+    fontprops = FontProperties(family=family, size=size, weight=weight)
+    words = sorted(set(text.split())) + LIGATURES
+    widths = GlyphAdvances(fontprops, dpi).widths(words)
+
+    _, renderer = measuring_renderer(dpi)
+    em = size * dpi / 72
+    for word, width in zip(words, widths):
+        if not np.isnan(width):
+            measured = renderer.get_text_width_height_descent(word, fontprops, ismath=False)[0]
+            assert abs(width - measured) <= 0.01 * em, word
+
+
+def test_glyph_widths_leave_ligatures_to_the_renderer():
+    widths = GlyphAdvances(FontProperties(family='DejaVu Sans', size=10), 100).widths(['office', 'fluffy', 'plain'])
+    assert np.isnan(widths[:2]).all()
+    assert widths[2] > 0
+
+
+def test_glyphs_layout_matches_renderer(text, axes, state):
+    text = ' '.join([text] + LIGATURES)
+    reference = ParaMPL(axes(), width=0.8, fontsize=11).write(text, (0.1, 0.9), justify='full')
+    written = ParaMPL(axes(), width=0.8, fontsize=11, measure='glyphs').write(text, (0.1, 0.9), justify='full')
+    assert state(written.artists) == state(reference.artists)
@@ -0,0 +1,15 @@
+import pickle
+
+from parampl import ParaMPL
+from parampl.metrics import MetricCache
+
+
+def test_metric_cache_survives_pickling(text, axes):
+    metrics = MetricCache()
+    written = ParaMPL(axes(), width=0.8, fontsize=8, metric_cache=metrics).write(text, (0.1, 0.9))
+
+    para = ParaMPL(axes(), width=0.8, fontsize=8, metric_cache=pickle.loads(pickle.dumps(metrics)), stats=True)
+    layout = para.layout(text, (0.1, 0.9))
+    counts, = para.stats.report()['fonts'].values()
+    assert counts['misses'] == 0
+    assert layout.total_height == written.total_height
@@ -0,0 +1,37 @@
+import random
+
+import pytest
+
+from parampl.statics import iter_paragraphs, split_into_paragraphs
+
+
+def _random_chunks(rng, text):
+    chunks, start = [], 0
+    while start < len(text):
+        stop = start + rng.randint(0, 8)
+        chunks.append(text[start:stop])
+        start = stop
+    return chunks
+
+
+@pytest.mark.parametrize('paragraph_per_line', [False, True])
+@pytest.mark.parametrize('collapse_whites', [True, False])
+def test_iter_paragraphs_matches_split(collapse_whites, paragraph_per_line):
+    rng = random.Random(0)
+    for _ in range(500):
+        text = ''.join(rng.choice(['word', 'a', ' ', ' ', '\t', '\n', '\n\n', ' \n \n ']) for _ in range(40))
+        expected, _ = split_into_paragraphs(text, collapse_whites=collapse_whites,
+                                            paragraph_per_line=paragraph_per_line)
+        paragraphs = list(iter_paragraphs(_random_chunks(rng, text), collapse_whites=collapse_whites,
+                                          paragraph_per_line=paragraph_per_line))
+        assert paragraphs == expected
+
+
+def test_iter_paragraphs_yields_before_the_end():
+    def lines():
+        yield 'first paragraph\n'
+        yield '\n'
+        yield 'second'
+        raise AssertionError("read past the second paragraph")
+
+    assert next(iter(iter_paragraphs(lines()))) == 'first paragraph'
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from parampl import ParaMPL
+
+
+@pytest.mark.parametrize('runs', [False, True])
+def test_rotated_lines_align(text, axes, runs):
+    ax = axes()
+    text = text.replace('\n\n', ' ')
+    artists, _ = ParaMPL(ax, width=0.5, fontsize=10).write([text] if runs else text, (0.1, 0.05),
+                                                           justify='full', rotation=90)
+    assert {artist.get_rotation_mode() for artist in artists} == {'anchor'}
+
+    # vertical lines whose tallest glyphs reach the same height are evenly spaced, the last one included
+    renderer = FigureCanvasAgg(ax.figure).get_renderer()
+    lefts = [artist.get_window_extent(renderer).x0 for artist in artists]
+    assert np.diff(lefts) == pytest.approx(np.diff(lefts)[0])
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from parampl import ParaMPL
+from parampl.statics import split_into_paragraphs, split_runs_into_paragraphs
+
+
+def test_style_changes_inside_a_word():
+    paragraphs, _ = split_runs_into_paragraphs([('ab', 0), ('cd ef', 1), ('gh\n\nij', 2)])
+
+    assert paragraphs == [[[(0, 'ab'), (1, 'cd')], [(1, 'ef'), (2, 'gh')]], [[(2, 'ij')]]]
+
+
+def test_empty_words_and_runs():
+    paragraphs, _ = split_runs_into_paragraphs([('', 0), ('a  ', 1), ('', 2), ('b', 3)], collapse_whites=False)
+    assert paragraphs == [[[(1, 'a')], [(1, '')], [(3, 'b')]]]
+
+    paragraphs, _ = split_runs_into_paragraphs([('', 0)])
+    assert paragraphs == [[[(0, '')]]]
+
+
+@pytest.mark.parametrize('collapse_whites', [True, False])
+def test_pieces_join_into_the_words_of_the_text(collapse_whites):
+    rng = random.Random(0)
+    for _ in range(300):
+        text = ''.join(rng.choice(['word', 'a', ' ', ' ', '\t', '\n', '\n\n']) for _ in range(30))
+        cuts = sorted(rng.sample(range(len(text) + 1), rng.randint(0, 6)))
+        runs = [(text[start:stop], idx) for idx, (start, stop) in enumerate(zip([0] + cuts, cuts + [len(text)]))]
+
+        paragraphs, _ = split_runs_into_paragraphs(runs, collapse_whites=collapse_whites)
+        expected, _ = split_into_paragraphs(text, collapse_whites=collapse_whites)
+        assert [' '.join(''.join(piece for _, piece in word) for word in paragraph)
+                for paragraph in paragraphs] == expected
+
+
+def _lines(layout):
+    return [(layout.text(idx), layout.x[idx], layout.y[idx]) for idx in range(len(layout))]
+
+
+@pytest.mark.parametrize('kwargs', [{'justify': 'left'}, {'justify': 'full'}, {'linebreak': 'optimal'}])
+def test_unstyled_runs_lay_out_as_text(text, axes, kwargs):
+    reference = ParaMPL(axes(), width=0.8, fontsize=8).layout(text, (0.1, 0.9), **kwargs)
+
+    cut = text.index('dolor') + 2
+    for runs in [[text], [text[:cut], text[cut:]], [text[:cut], (text[cut:], {})]]:
+        layout = ParaMPL(axes(), width=0.8, fontsize=8).layout(runs, (0.1, 0.9), **kwargs)
+        assert _lines(layout) == _lines(reference)
+
+
+def test_color_change_inside_a_word_keeps_the_layout(text, axes):
+    cut = text.index('dolor') + 2
+    reference = ParaMPL(axes(), width=0.8, fontsize=8).write(text, (0.1, 0.9))
+    written = ParaMPL(axes(), width=0.8, fontsize=8).write([text[:cut], (text[cut:cut + 3], {'color': 'red'}),
+                                                            text[cut + 3:]], (0.1, 0.9))
+
+    assert written.total_height == reference.total_height
+    assert [artist.get_text() for artist in written.artists if artist.get_color() == 'red'] == ['lor']
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from parampl import ParaMPL, WrittenParagraph
+
+RUNS = ["Plain ", ("bold", {'weight': 'bold'}), " and ", ("red", {'color': 'red'}), " words " * 10]
+
+
+@pytest.mark.parametrize('styled, kwargs', [(False, {'justify': 'full', 'max_height': 0.4}),
+                                            (False, {'linebreak': 'optimal', 'avoid_right_of': (0.6, (0.5, 0.8))}),
+                                            (True, {'width': 0.5, 'justify': 'full'}),
+                                            ])
+def test_replay_rebuilds_the_layout(tmp_path, text, axes, state, styled, kwargs):
+    written = ParaMPL(axes(), width=0.8, fontsize=8).write(RUNS if styled else text, (0.1, 0.9), **kwargs)
+    written.save(tmp_path / 'snapshot.json')
+
+    para = ParaMPL(axes(), width=0.8, fontsize=8, stats=True)
+    replayed = para.replay(tmp_path / 'snapshot.json')
+    assert isinstance(replayed, WrittenParagraph)
+    assert 'measure' not in para.stats.report()['phases']
+    assert state(replayed.artists) == state(written.artists)
+    assert replayed.total_height == written.total_height
+    assert replayed.leftover == written.leftover
+
+    replayed.save(tmp_path / 'again.json')
+    assert json.loads((tmp_path / 'again.json').read_text()) == json.loads((tmp_path / 'snapshot.json').read_text())
+
+
+def test_replay_can_be_updated(tmp_path, text, axes, state):
+    ParaMPL(axes(), width=0.8, fontsize=8).write(text, (0.1, 0.9), justify='full').save(tmp_path / 'snapshot.json')
+    edited = text.replace('Proin metus', 'Proin edited metus')
+
+    replayed = ParaMPL(axes(), width=0.8, fontsize=8).replay(tmp_path / 'snapshot.json')
+    replayed.update(edited)
+    reference = ParaMPL(axes(), width=0.8, fontsize=8).write(edited, (0.1, 0.9), justify='full')
+    assert state(replayed.artists) == state(reference.artists)
+
+
+def test_replay_writes_again_if_the_fonts_differ(tmp_path, text, axes):
+    ParaMPL(axes(), width=0.8, fontsize=8).write(text, (0.1, 0.9)).save(tmp_path / 'snapshot.json')
+
+    para = ParaMPL(axes(), width=0.8, fontsize=9, stats=True)
+    replayed = para.replay(tmp_path / 'snapshot.json')
+    assert isinstance(replayed, WrittenParagraph)
+    assert 'measure' in para.stats.report()['phases']
+    assert replayed.artists[0].get_fontsize() == 9
@@ -0,0 +1,25 @@
+import time
+
+from parampl import ParaMPL
+from parampl.metrics import MetricCache
+
+
+def test_fonts_are_reported_by_name(text, axes):
+    para = ParaMPL(axes(), width=0.8, fontsize=8, family='serif', stats=True)
+    para.write(text, (0.1, 0.9))
+    para.write(text, (0.1, 0.9), weight='bold', style='italic', fontsize=9.5)
+
+    assert set(para.stats.report()['fonts']) == {'serif 8pt', 'serif 9.5pt bold italic'}
+    assert 'serif 9.5pt bold italic' in str(para.stats)
+
+
+def test_stream_phases_add_up(text, axes):
+    para = ParaMPL(axes(), width=0.8, fontsize=8, metric_cache=MetricCache(), stats=True)
+    start = time.perf_counter()
+    para.write_stream(iter(text.splitlines(keepends=True)), (0.1, 0.9))
+    elapsed = time.perf_counter() - start
+
+    phases = para.stats.report()['phases']
+    # the stream is read and measured while breaking lines, which must not count those phases twice
+    assert {'measure', 'breaks'} <= set(phases)
+    assert sum(phase['time'] for phase in phases.values()) <= elapsed
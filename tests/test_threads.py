@@ -0,0 +1,42 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from parampl import ParaMPL
+from parampl.metrics import MetricCache
+
+WORDS = [f"w{idx}{'x' * (idx % 7)}" for idx in range(2000)]
+
+
+def _lay_out(ax, seed, metric_cache):
+    rng = np.random.default_rng(seed)
+    para = ParaMPL(ax, width=0.8, fontsize=6 + seed % 3, metric_cache=metric_cache)
+    layout = para.layout(' '.join(rng.choice(WORDS, 400)), (0.1, 0.9), justify='full')
+    return [(layout.text(idx), layout.x[idx], layout.y[idx]) for idx in range(len(layout))]
+
+
+def test_threads_share_a_metric_cache(axes):
+    expected = [_lay_out(axes(), seed, MetricCache()) for seed in range(8)]
+
+    shared = MetricCache()
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda seed: _lay_out(axes(), seed, shared), range(8)))
+
+    assert results == expected
+
+
+def test_threads_keep_their_own_leftover(text, axes):
+    para = ParaMPL(axes(), width=0.8, fontsize=8)
+    barrier = threading.Barrier(4)
+
+    def lay_out(max_height):
+        layout = para.layout(text, (0.1, 0.9), max_height=max_height)
+        barrier.wait()  # every thread has laid out its text before any reads the leftover
+        return layout.leftover, para.leftover
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lay_out, [0.05, 0.1, 0.2, None]))
+
+    assert len({leftover for leftover, _ in results}) == 4
+    assert all(own == leftover for leftover, own in results)
@@ -0,0 +1,46 @@
+import pytest
+
+from parampl import ParaMPL
+
+
+def _edits(text):
+    paragraphs = text.split('\n\n')
+    yield text.replace('amet,', 'ametxx,')
+    yield text.replace(' cursus at ', ' ')
+    yield text.replace('Proin metus', 'Proin inserted metus')
+    yield text + ' tail words'
+    yield '\n\n'.join(paragraphs[:2])
+    yield '\n\n'.join(paragraphs + ['A new last paragraph.'])
+    yield '\n\n'.join([paragraphs[0], 'A new middle paragraph.'] + paragraphs[1:])
+
+
+@pytest.mark.parametrize('kwargs', [{'justify': 'full'},
+                                    {'justify': 'left', 'va': 'center'},
+                                    {'justify': 'full', 'max_height': 0.3},
+                                    {'linebreak': 'optimal', 'justify': 'full'},
+                                    {'fit': 'shrink', 'max_height': 0.3, 'fontsize': 14},
+                                    {'justify': 'right', 'avoid_left_of': (0.4, (0.5, 0.7))},
+                                    ])
+def test_update_matches_write(text, axes, state, kwargs):
+    ax = axes()
+    written = ParaMPL(ax, width=0.8, fontsize=8).write(text, (0.1, 0.9), **kwargs)
+    for edited in _edits(text):
+        written.update(edited)
+        reference = ParaMPL(axes(), width=0.8, fontsize=8)
+        artists, total_height = reference.write(edited, (0.1, 0.9), **kwargs)
+
+        assert state(ax.texts) == state(artists)
+        assert sorted(map(id, written.artists)) == sorted(map(id, ax.texts))
+        assert written.leftover == reference.leftover
+        assert written[1] == total_height
+        assert tuple(written) == (written.artists, total_height)
+
+
+def test_update_measures_the_changed_paragraph(text, axes):
+    para = ParaMPL(axes(), width=0.8, fontsize=8, stats=True)
+    written = para.write(text, (0.1, 0.9))
+    para.stats.reset()
+
+    written.update(text.replace('Proin metus', 'Proin changed metus'))
+    counts, = para.stats.report()['fonts'].values()
+    assert counts['hits'] + counts['misses'] == len(set(text.split('\n\n')[1].split())) + 1